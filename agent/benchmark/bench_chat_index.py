@@ -0,0 +1,64 @@
+"""
+Microbenchmark for the conversation index counter: the previous get_item/put_item read-modify-write against
+the atomic UpdateItem ADD used by Chat.increment_chat_index, on a local DynamoDB stand-in.
+
+Usage: python bench_chat_index.py [--threads 8] [--increments 50] [--latency-ms 5]
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda', 'agent-handler'))
+os.environ.setdefault('CONVERSATION_INDEX_TABLE', 'ConversationIndexTable')
+
+import chat
+from fakes import FakeDynamoDBClient, stats
+
+def read_modify_write_increment(client, user_id):
+    """
+    The previous implementation: read the index, then write it back incremented.
+    """
+    key = {'id': {'S': user_id}}
+    response = client.get_item(TableName=chat.conversation_index_table_name, Key=key)
+    chat_index = int(response['Item']['chat_index']['N']) if 'Item' in response else 0
+    client.put_item(
+        TableName=chat.conversation_index_table_name,
+        Item={'id': {'S': user_id}, 'chat_index': {'N': str(chat_index + 1)}, 'updated_at': {'S': str(time.time())}}
+    )
+
+def atomic_increment(client, user_id):
+    conversation = chat.Chat.__new__(chat.Chat)
+    conversation.user_id = user_id
+    conversation.increment_chat_index()
+
+def run(name, increment, threads, increments, latency):
+    client = FakeDynamoDBClient(latency)
+    chat.get_dynamodb_client = lambda: client
+    stats.reset()
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(increment, client, 'Demo User') for _ in range(threads * increments)]:
+            future.result()
+    elapsed = time.perf_counter() - start_time
+
+    expected = threads * increments
+    final = int(client.get_item(TableName=chat.conversation_index_table_name, Key={'id': {'S': 'Demo User'}})['Item']['chat_index']['N'])
+    round_trips = sum(stats.calls.values()) - 1
+    print(f"{name:<20} {elapsed * 1000:>9.1f} ms  {round_trips / expected:>4.1f} round-trips/increment  final={final}/{expected}  lost updates={expected - final}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--increments', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    run('read-modify-write', read_modify_write_increment, args.threads, args.increments, latency)
+    run('atomic UpdateItem', atomic_increment, args.threads, args.increments, latency)
+
+if __name__ == '__main__':
+    main()
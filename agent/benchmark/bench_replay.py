@@ -0,0 +1,345 @@
+"""
+Replay benchmark for lambda_function.handler: replays Lex V2 events for identity verification, the full loan
+application slot sequence, the loan calculator and FAQ questions from AnyCompany-FAQs.csv through the handler,
+with Bedrock, Kendra, DynamoDB and S3 replaced by in-process fakes with configurable latency.
+Each session verifies as its own seeded user, so account lookups are not all served by the warm-up's cached one.
+Reports per-intent latency percentiles, calls per service, account and answer cache hits and allocations per request.
+Before measuring, checks that a failed accounts lookup re-elicits UserName instead of accepting it.
+
+Usage: python bench_replay.py [--sessions 10] [--warmup 1] [--bedrock-ms 800] [--kendra-ms 150] [--dynamodb-ms 8]
+                              [--s3-ms 25] [--timeout-ms 30000] [--no-tracemalloc]
+Handler settings (e.g. FAQ_SHORT_CIRCUIT, BEDROCK_STREAMING, SUMMARY_STRATEGY) are read from the environment as in Lambda.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from decimal import Decimal
+from collections import defaultdict
+from contextlib import redirect_stdout
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+HANDLER_DIR = os.path.join(BENCHMARK_DIR, '..', 'lambda', 'agent-handler')
+ASSETS_DIR = os.path.join(BENCHMARK_DIR, '..', 'assets')
+MOCK_DATA = os.path.join(BENCHMARK_DIR, '..', 'lambda', 'data-loader', 'MOCK_DATA.json')
+sys.path.insert(0, HANDLER_DIR)
+
+ENVIRONMENT = {
+    'AWS_REGION': 'us-east-1',
+    'USER_EXISTING_ACCOUNTS_TABLE': 'UserExistingAccountsTable',
+    'USER_PENDING_ACCOUNTS_TABLE': 'UserPendingAccountsTable',
+    'CONVERSATION_INDEX_TABLE': 'ConversationIndexTable',
+    'CONVERSATION_TABLE': 'ConversationTable',
+    'KENDRA_INDEX_ID': 'benchmark-index',
+    'S3_ARTIFACT_BUCKET_NAME': 'benchmark-artifacts',
+    'CHAT_MEMORY_MODE': 'window',
+    'BEDROCK_STREAMING': 'true'
+}
+for name, value in ENVIRONMENT.items():
+    os.environ.setdefault(name, value)
+
+import clients
+from fakes import FakeBedrockRuntime, FakeDynamoDBClient, FakeDynamoDBResource, FakeKendra, FakeS3Client, stats
+from local_index import build_index, get_local_index, read_faqs
+
+KEY_SCHEMAS = {
+    os.environ['USER_EXISTING_ACCOUNTS_TABLE']: ['userName', 'planName'],
+    os.environ['USER_PENDING_ACCOUNTS_TABLE']: ['userName', 'planName'],
+    os.environ['CONVERSATION_TABLE']: ['SessionId']
+}
+
+LOAN_APPLICATION_ANSWERS = [
+    ('LoanValue', '$450,000'), ('MonthlyIncome', '9k'), ('WorkHistory', 'yeah I do'), ('CreditScore', 'about 720'),
+    ('HousingExpense', '2000'), ('DebtAmount', '150'), ('DownPayment', '50000'), ('Coborrow', 'no'),
+    ('ClosingDate', '2025-06-01')
+]
+
+CALCULATOR_UTTERANCES = ['Mortgage Calculator', 'What would $400k at 6.5% for 30 years cost with an extra $200?', 'refinance at 4.5%']
+
+class LambdaContext:
+    """
+    The part of the Lambda context object the handler uses.
+    """
+
+    def __init__(self, timeout_ms):
+        self.deadline = time.perf_counter() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return max(int((self.deadline - time.perf_counter()) * 1000), 0)
+
+def install_fakes(args):
+    """
+    Registers the fakes as the container-wide clients and seeds the accounts table from the data loader's mock data.
+    Returns the first mock account, the template for the per-session users (see seed_account).
+    """
+    latency = lambda milliseconds: milliseconds / 1000
+
+    index_path = os.environ.get('LOCAL_INDEX_PATH') or os.path.join(HANDLER_DIR, 'faq_index')
+    if not os.path.exists(os.path.join(index_path, 'documents.json')):
+        build_index(os.path.join(ASSETS_DIR, 'AnyCompany-FAQs.csv'), index_path)
+
+    with open(os.path.join(ASSETS_DIR, 'Mortgage-Loan-Application.pdf'), 'rb') as file:
+        template = file.read()
+
+    dynamodb_resource = FakeDynamoDBResource(KEY_SCHEMAS, latency(args.dynamodb_ms))
+    clients._clients.update({
+        'dynamodb_resource': dynamodb_resource,
+        'dynamodb': FakeDynamoDBClient(latency(args.dynamodb_ms)),
+        's3': FakeS3Client({'agent/assets/Mortgage-Loan-Application.pdf': template}, latency(args.s3_ms)),
+        'bedrock-runtime': FakeBedrockRuntime(latency(args.bedrock_ms)),
+        'kendra': FakeKendra(get_local_index(index_path), latency(args.kendra_ms))
+    })
+
+    with open(MOCK_DATA, encoding='utf-8') as file:
+        accounts = json.load(file, parse_float=Decimal)
+    accounts_table = dynamodb_resource.Table(os.environ['USER_EXISTING_ACCOUNTS_TABLE'])
+    for account in accounts:
+        accounts_table.items[accounts_table._key(account)] = account
+    return accounts[0]
+
+def seed_account(account, user_name):
+    """
+    Copies every account item of 'account's user to 'user_name' and returns the copy of 'account'.
+    """
+    accounts_table = clients._clients['dynamodb_resource'].Table(os.environ['USER_EXISTING_ACCOUNTS_TABLE'])
+    for item in [item for item in accounts_table.items.values() if item['userName'] == account['userName']]:
+        seeded = dict(item, userName=user_name)
+        accounts_table.items[accounts_table._key(seeded)] = seeded
+    return dict(account, userName=user_name)
+
+def slot(value):
+    if value is None:
+        return None
+    return {'shape': 'Scalar', 'value': {'originalValue': value, 'resolvedValues': [value], 'interpretedValue': value}}
+
+def lex_event(session_id, intent_name, slots, transcript, session_attributes, confirmation_state='None'):
+    return {
+        'sessionId': session_id,
+        'inputTranscript': transcript,
+        'invocationSource': 'DialogCodeHook',
+        'bot': {'name': 'FSIBot', 'version': 'DRAFT', 'localeId': 'en_US'},
+        'sessionState': {
+            'sessionAttributes': dict(session_attributes),
+            'intent': {
+                'name': intent_name,
+                'slots': {name: slot(value) for name, value in slots.items()},
+                'state': 'InProgress',
+                'confirmationState': confirmation_state
+            }
+        }
+    }
+
+def session_attributes_of(response, previous):
+    return response['sessionState'].get('sessionAttributes') or previous
+
+def returned_slots(response, slots):
+    """
+    Lex sends the next turn with the slots as the handler left them, including values it normalized.
+    """
+    intent = response['sessionState'].get('intent') or {}
+    returned = intent.get('slots') or {}
+    return {name: (returned[name]['value']['interpretedValue'] if returned.get(name) else value) for name, value in slots.items()}
+
+def verify_identity(session_id, account):
+    response = yield lex_event(session_id, 'VerifyIdentity', {'UserName': account['userName'], 'Pin': str(account['pin'])}, str(account['pin']), {})
+    return session_attributes_of(response, {})
+
+def loan_application_session(session_id, account):
+    """
+    Verifies the user, answers every loan application slot in turn and confirms the application.
+    """
+    session_attributes = yield from verify_identity(session_id, account)
+
+    slots = {name: None for name, _ in LOAN_APPLICATION_ANSWERS}
+    slots['UserName'] = account['userName']
+    for name, answer in LOAN_APPLICATION_ANSWERS:
+        slots[name] = answer
+        response = yield lex_event(session_id, 'LoanApplication', slots, answer, session_attributes)
+        session_attributes = session_attributes_of(response, session_attributes)
+        slots = returned_slots(response, slots)
+
+    yield lex_event(session_id, 'LoanApplication', slots, 'yes', session_attributes, confirmation_state='Confirmed')
+
+def calculator_session(session_id, account):
+    session_attributes = yield from verify_identity(session_id, account)
+    for utterance in CALCULATOR_UTTERANCES:
+        response = yield lex_event(session_id, 'LoanCalculator', {}, utterance, session_attributes)
+        session_attributes = session_attributes_of(response, session_attributes)
+
+def faq_session(session_id, questions):
+    """
+    Asks each FAQ question verbatim (answered from the curated FAQ when FAQ_SHORT_CIRCUIT is on) and reworded
+    (answered through Kendra and Bedrock).
+    """
+    session_attributes = {}
+    for question in questions:
+        for utterance in (question, f"I was wondering, {question[0].lower()}{question[1:]} Please explain in detail."):
+            response = yield lex_event(session_id, 'FallbackIntent', {}, utterance, session_attributes)
+            session_attributes = session_attributes_of(response, session_attributes)
+
+def build_sessions(count, account, questions, prefix):
+    sessions = []
+    for number in range(count):
+        session_id = f"{prefix}-{number}"
+        sessions.append(loan_application_session(f"{session_id}-loan", seed_account(account, f"{session_id} loan")))
+        sessions.append(calculator_session(f"{session_id}-calculator", seed_account(account, f"{session_id} calculator")))
+        # Each FAQ session asks a rotating slice of the FAQ
+        start = (number * 3) % len(questions)
+        sessions.append(faq_session(f"{session_id}-faq", (questions + questions)[start:start + 3]))
+    return sessions
+
+def replay(sessions, handler, timeout_ms, track_allocations):
+    """
+    Runs every session script, feeding each handler response back into the script for the next event.
+    Returns per-intent latencies (ms) and allocation peaks (bytes).
+    """
+    latencies = defaultdict(list)
+    allocations = defaultdict(list)
+    output = io.StringIO()
+
+    for script in sessions:
+        try:
+            event = next(script)
+        except StopIteration:
+            continue
+        while True:
+            intent_name = event['sessionState']['intent']['name']
+            if track_allocations:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+
+            start_time = time.perf_counter()
+            # The handler logs with print, which would dominate the measurement on a terminal
+            with redirect_stdout(output):
+                response = handler(event, LambdaContext(timeout_ms))
+            latencies[intent_name].append((time.perf_counter() - start_time) * 1000)
+
+            if track_allocations:
+                allocations[intent_name].append(tracemalloc.get_traced_memory()[1] - baseline)
+            output.seek(0)
+            output.truncate()
+
+            try:
+                event = script.send(response)
+            except StopIteration:
+                break
+
+    return latencies, allocations
+
+def check_failed_account_lookup(handler, timeout_ms):
+    """
+    Fails the accounts query during a loan application turn and asserts that UserName is re-elicited and not
+    recorded as a validated session fact.
+    """
+    import accounts
+
+    def failing_query(**kwargs):
+        raise RuntimeError('Simulated DynamoDB error')
+
+    table = clients._clients['dynamodb_resource'].Table(os.environ['USER_EXISTING_ACCOUNTS_TABLE'])
+    accounts._account_cache.clear()
+    table.query = failing_query
+    try:
+        event = lex_event('lookup-failure', 'LoanApplication', {'UserName': 'Unverified User'}, 'Unverified User', {})
+        with redirect_stdout(io.StringIO()):
+            response = handler(event, LambdaContext(timeout_ms))
+    finally:
+        del table.query
+
+    state = response['sessionState']
+    assert state['dialogAction'] == {'type': 'ElicitSlot', 'slotToElicit': 'UserName'}, state['dialogAction']
+    facts = json.loads((state.get('sessionAttributes') or {}).get('validatedFacts') or '{}')
+    assert 'UserName' not in facts, facts
+    print("Failed account lookup: UserName re-elicited, no session fact recorded")
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile.
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+def cache_stats():
+    import tools
+    from accounts import account_cache_stats
+    answers = tools.answer_cache.stats() if tools.answer_cache is not None else {}
+    return {'account': account_cache_stats(), 'answer': answers}
+
+def cache_hits(before, after):
+    """
+    Returns the hits and misses of each cache between two cache_stats() snapshots.
+    """
+    counts = {}
+    for cache, current in after.items():
+        counts[cache] = {name: value - before[cache].get(name, 0) for name, value in current.items() if name in ('hits', 'similar_hits', 'misses')}
+    return counts
+
+def report(latencies, allocations, elapsed, caches):
+    requests = sum(len(values) for values in latencies.values())
+    print(f"\n{requests} requests in {elapsed:.1f} s\n")
+    print(f"{'intent':<18} {'requests':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'alloc KiB':>10}")
+    for intent_name, values in sorted(latencies.items()):
+        peaks = allocations.get(intent_name)
+        allocated = f"{sum(peaks) / len(peaks) / 1024:>10.1f}" if peaks else f"{'-':>10}"
+        print(f"{intent_name:<18} {len(values):>8} {percentile(values, 0.5):>9.1f} {percentile(values, 0.95):>9.1f} "
+              f"{percentile(values, 0.99):>9.1f} {max(values):>9.1f} {allocated}")
+
+    print(f"\n{'service call':<48} {'calls':>7} {'per request':>12}")
+    for operation, count in sorted(stats.calls.items()):
+        print(f"{operation:<48} {count:>7} {count / requests:>12.2f}")
+
+    # Cache hits make no service call, so they are reported apart from the calls above
+    print(f"\n{'cache':<18} {'hits':>7} {'misses':>7} {'hit rate':>9}")
+    for cache, counts in sorted(caches.items()):
+        if not counts:
+            print(f"{cache:<18} {'disabled':>7}")
+            continue
+        hits = counts['hits'] + counts.get('similar_hits', 0)
+        lookups = hits + counts['misses']
+        print(f"{cache:<18} {hits:>7} {counts['misses']:>7} {hits / lookups if lookups else 0.0:>9.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=10, help='replayed sessions of each kind')
+    parser.add_argument('--warmup', type=int, default=1, help='sessions of each kind run first and not measured (cold start)')
+    parser.add_argument('--bedrock-ms', type=float, default=800.0)
+    parser.add_argument('--kendra-ms', type=float, default=150.0)
+    parser.add_argument('--dynamodb-ms', type=float, default=8.0)
+    parser.add_argument('--s3-ms', type=float, default=25.0)
+    parser.add_argument('--timeout-ms', type=float, default=30000.0, help='Lambda timeout seen by the handler')
+    parser.add_argument('--no-tracemalloc', action='store_true', help='skip allocation tracking, which slows Python code down')
+    args = parser.parse_args()
+
+    account = install_fakes(args)
+    questions = [faq['question'] for faq in read_faqs(os.path.join(ASSETS_DIR, 'AnyCompany-FAQs.csv'))]
+
+    with redirect_stdout(io.StringIO()):
+        import accounts
+        import lambda_function
+
+    if args.warmup:
+        start_time = time.perf_counter()
+        replay(build_sessions(args.warmup, account, questions, 'warmup'), lambda_function.handler, args.timeout_ms, False)
+        print(f"Warm-up (includes cold start): {time.perf_counter() - start_time:.1f} s")
+    check_failed_account_lookup(lambda_function.handler, args.timeout_ms)
+    # Measured sessions use new users, but the warm-up's account lookups must not be served from the cache either
+    accounts._account_cache.clear()
+    stats.reset()
+    caches_before = cache_stats()
+
+    if not args.no_tracemalloc:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    latencies, allocations = replay(build_sessions(args.sessions, account, questions, 'session'), lambda_function.handler, args.timeout_ms, not args.no_tracemalloc)
+    elapsed = time.perf_counter() - start_time
+    caches = cache_hits(caches_before, cache_stats())
+    if not args.no_tracemalloc:
+        tracemalloc.stop()
+
+    report(latencies, allocations, elapsed, caches)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Microbenchmark for yes/no classification: the previous difflib-based isvalid_yes_or_no against the precomputed
+polarity lookup used by slot_parser.yes_no_polarity, on a mix of answers, typos and near-miss words.
+
+Usage: python bench_yes_no.py [--iterations 20000]
+"""
+import os
+import sys
+import time
+import difflib
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda', 'agent-handler'))
+
+from slot_parser import UNKNOWN, yes_no_polarity
+
+# (answer, expected polarity); None marks answers that should go to the LLM fallback
+SAMPLES = [
+    ('yes', 'Yes'), ('Yes.', 'Yes'), ('yeah', 'Yes'), ('yep', 'Yes'), ('yse', 'Yes'), ('yeah I do', 'Yes'), ('sure', 'Yes'),
+    ('no', 'No'), ('nope', 'No'), ('nah', 'No'), ('noo', 'No'), ("no, I don't", 'No'), ('not really', 'No'),
+    ('yet', None), ('note', None), ('nose', None), ('maybe', None), ('I work part time', None), ('two years', None)
+]
+
+def legacy_isvalid_yes_or_no(word):
+    """
+    The previous implementation from lambda_function.py.
+    """
+    reference_words = ['yes', 'no', 'yep', 'nope']
+    similarity_threshold = 0.7
+
+    similarity_scores = [difflib.SequenceMatcher(None, word.lower(), ref_word).ratio() for ref_word in reference_words]
+    return any(score >= similarity_threshold for score in similarity_scores)
+
+def legacy_polarity(answer):
+    """
+    The legacy check only says whether an answer looks like yes or no, so it is scored on accepting the right answers.
+    """
+    return 'accepted' if legacy_isvalid_yes_or_no(answer) else None
+
+def polarity(answer):
+    result = yes_no_polarity(answer)
+    return None if result == UNKNOWN else result
+
+def run(name, classify, score, iterations):
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        for answer, _ in SAMPLES:
+            classify(answer)
+    elapsed = time.perf_counter() - start_time
+
+    calls = iterations * len(SAMPLES)
+    correct = sum(score(classify(answer), expected) for answer, expected in SAMPLES)
+    print(f"{name:<18} {elapsed / calls * 1e6:>7.2f} us/call  correct={correct}/{len(SAMPLES)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    run('difflib (legacy)', legacy_polarity, lambda result, expected: (result is None) == (expected is None), args.iterations)
+    run('polarity lookup', polarity, lambda result, expected: result == expected, args.iterations)
+
+if __name__ == '__main__':
+    main()
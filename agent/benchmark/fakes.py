@@ -0,0 +1,260 @@
+"""
+In-process stand-ins for the AWS services used by the agent handler, for offline benchmarks.
+Every call sleeps for a configurable latency and is counted, so round-trips show up in benchmark results.
+"""
+import io
+import re
+import json
+import time
+import threading
+from collections import Counter
+
+class ServiceStats:
+    """
+    Thread-safe call counter shared by all fakes.
+    """
+
+    def __init__(self):
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, operation):
+        with self.lock:
+            self.calls[operation] += 1
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+
+stats = ServiceStats()
+
+class FakeService:
+
+    service_name = 'service'
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def call(self, operation):
+        stats.record(f"{self.service_name}.{operation}")
+        if self.latency:
+            time.sleep(self.latency)
+
+class FakeDynamoDBClient(FakeService):
+    """
+    Low-level DynamoDB client stand-in holding items as attribute-value dicts.
+    Supports the subset of UpdateExpression syntax the handler uses: 'ADD name :value' and 'SET name = :value'.
+    """
+
+    service_name = 'dynamodb'
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def _key(self, key):
+        return tuple(sorted((name, tuple(value.items())) for name, value in key.items()))
+
+    def get_item(self, TableName, Key, **kwargs):
+        self.call('get_item')
+        with self.lock:
+            item = self.tables.get(TableName, {}).get(self._key(Key))
+        return {'Item': dict(item)} if item is not None else {}
+
+    def put_item(self, TableName, Item, **kwargs):
+        self.call('put_item')
+        key = {name: value for name, value in Item.items() if name in ('id', 'SessionId', 'userName', 'planName')}
+        with self.lock:
+            self.tables.setdefault(TableName, {})[self._key(key)] = dict(Item)
+        return {}
+
+    def update_item(self, TableName, Key, UpdateExpression, ExpressionAttributeValues, ReturnValues='NONE', **kwargs):
+        self.call('update_item')
+        # The whole update is applied under one lock, as DynamoDB applies it atomically
+        with self.lock:
+            table = self.tables.setdefault(TableName, {})
+            item = table.setdefault(self._key(Key), dict(Key))
+            updated = {}
+            for name, placeholder in re.findall(r"ADD (\w+) (:\w+)", UpdateExpression):
+                current = float(item.get(name, {'N': '0'})['N'])
+                total = current + float(ExpressionAttributeValues[placeholder]['N'])
+                item[name] = updated[name] = {'N': str(int(total)) if total.is_integer() else str(total)}
+            for name, placeholder in re.findall(r"(\w+) = (:\w+)", UpdateExpression):
+                item[name] = updated[name] = ExpressionAttributeValues[placeholder]
+        return {'Attributes': updated} if ReturnValues == 'UPDATED_NEW' else {}
+
+class FakeTable(FakeService):
+    """
+    boto3 DynamoDB Table stand-in holding plain Python items, keyed by 'key_names'.
+    """
+
+    service_name = 'dynamodb.table'
+
+    def __init__(self, name, key_names, latency=0.0):
+        super().__init__(latency)
+        self.name = name
+        self.key_names = key_names
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def _key(self, item):
+        return tuple(item.get(name) for name in self.key_names)
+
+    def get_item(self, Key, **kwargs):
+        self.call('get_item')
+        with self.lock:
+            item = self.items.get(self._key(Key))
+        return {'Item': dict(item)} if item is not None else {}
+
+    def put_item(self, Item, **kwargs):
+        self.call('put_item')
+        with self.lock:
+            self.items[self._key(Item)] = dict(Item)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, **kwargs):
+        """
+        Supports 'SET name = list_append(if_not_exists(name, :empty), :values)' and 'SET name = :value'.
+        """
+        self.call('update_item')
+        with self.lock:
+            item = self.items.setdefault(self._key(Key), dict(Key))
+            for name, empty, values in re.findall(r"(\w+) = list_append\(if_not_exists\(\w+, (:\w+)\), (:\w+)\)", UpdateExpression):
+                item[name] = list(item.get(name, ExpressionAttributeValues[empty])) + list(ExpressionAttributeValues[values])
+            for name, placeholder in re.findall(r"(\w+) = (:\w+)", UpdateExpression):
+                item[name] = ExpressionAttributeValues[placeholder]
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        self.call('delete_item')
+        with self.lock:
+            self.items.pop(self._key(Key), None)
+        return {}
+
+    def query(self, KeyConditionExpression, **kwargs):
+        """
+        Supports a single equality condition on the partition key, e.g. Key('userName').eq(name).
+        """
+        self.call('query')
+        expression = KeyConditionExpression.get_expression()
+        key, value = expression['values'][0].name, expression['values'][1]
+        with self.lock:
+            items = [dict(item) for item in self.items.values() if item.get(key) == value]
+        return {'Items': items, 'Count': len(items)}
+
+class FakeDynamoDBResource:
+    """
+    boto3 DynamoDB resource stand-in; tables are created on first use with the key schema in 'key_schemas'.
+    """
+
+    def __init__(self, key_schemas, latency=0.0):
+        self.key_schemas = key_schemas
+        self.latency = latency
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def Table(self, name):
+        with self.lock:
+            if name not in self.tables:
+                self.tables[name] = FakeTable(name, self.key_schemas.get(name, ['id']), self.latency)
+            return self.tables[name]
+
+class FakeStream(list):
+    """
+    Bedrock response stream stand-in: an iterable of events that can be closed.
+    """
+
+    def close(self):
+        pass
+
+class FakeBedrockRuntime(FakeService):
+    """
+    Returns a canned answer (with an inline summary) for Anthropic Messages and text completion request bodies.
+    Streaming responses are split into word chunks; the latency is spent before the first chunk.
+    """
+
+    service_name = 'bedrock'
+    answer = ("Based on our FAQ, AnyCompany offers fixed and adjustable rate mortgages. Rates depend on your credit score, "
+              "down payment and loan term. [Source 1: AnyCompany FAQ - https://www.example.com/faq]\n"
+              "<summary>Explained AnyCompany mortgage options and rate factors.</summary>")
+
+    def invoke_model(self, body, modelId, **kwargs):
+        self.call('invoke_model')
+        request = json.loads(body)
+        if 'messages' in request:
+            response = {'content': [{'type': 'text', 'text': self.answer}], 'usage': {'input_tokens': len(body) // 4, 'output_tokens': len(self.answer) // 4}}
+        else:
+            response = {'completion': self.answer}
+        return {'body': io.BytesIO(json.dumps(response).encode('utf-8'))}
+
+    def invoke_model_with_response_stream(self, body, modelId, **kwargs):
+        self.call('invoke_model_with_response_stream')
+        events = [{'type': 'content_block_delta', 'delta': {'type': 'text_delta', 'text': word + ' '}} for word in self.answer.split(' ')]
+        events.append({'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'}})
+        events.append({'type': 'message_stop', 'amazon-bedrock-invocationMetrics': {'inputTokenCount': len(body) // 4, 'outputTokenCount': len(self.answer) // 4}})
+        return {'body': FakeStream({'chunk': {'bytes': json.dumps(event).encode('utf-8')}} for event in events)}
+
+class FakeKendra(FakeService):
+    """
+    Answers Kendra Query and Retrieve calls from the offline BM25 FAQ index (local_index.py).
+    """
+
+    service_name = 'kendra'
+
+    def __init__(self, index, latency=0.0):
+        super().__init__(latency)
+        self.index = index
+
+    def query(self, QueryText, PageSize=5, **kwargs):
+        self.call('query')
+        return self.index.search(QueryText, PageSize)
+
+    def retrieve(self, QueryText, PageSize=5, **kwargs):
+        self.call('retrieve')
+        result_items = [{
+            'Id': item['Id'],
+            'DocumentId': item['Id'],
+            'DocumentTitle': item['DocumentTitle']['Text'],
+            'Content': item['DocumentExcerpt']['Text'],
+            'DocumentURI': item['DocumentURI'],
+            'DocumentAttributes': item['DocumentAttributes'],
+            'ScoreAttributes': item['ScoreAttributes']
+        } for item in self.index.search(QueryText, PageSize)['ResultItems']]
+        return {'ResultItems': result_items}
+
+class FakeS3Client(FakeService):
+    """
+    Serves 'objects' (key -> bytes) and keeps uploaded objects in memory.
+    """
+
+    service_name = 's3'
+
+    def __init__(self, objects, latency=0.0):
+        super().__init__(latency)
+        self.objects = dict(objects)
+        self.lock = threading.Lock()
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self.call('get_object')
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        self.call('download_file')
+        with open(Filename, 'wb') as file:
+            file.write(self.objects[Key])
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.call('put_object')
+        with self.lock:
+            self.objects[Key] = Body if isinstance(Body, bytes) else Body.read()
+        return {}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, **kwargs):
+        self.call('upload_fileobj')
+        with self.lock:
+            self.objects[Key] = Fileobj.read()
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600):
+        stats.record('s3.generate_presigned_url')
+        return f"https://{Params['Bucket']}.s3.amazonaws.com/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
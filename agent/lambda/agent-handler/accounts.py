@@ -0,0 +1,51 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from boto3.dynamodb.conditions import Key
+from clients import get_dynamodb_resource
+
+user_accounts_table_name = os.environ['USER_EXISTING_ACCOUNTS_TABLE']
+
+# A short TTL lets one identity verification turn, and the turns right after it, share a single query
+account_cache_ttl = float(os.environ.get('ACCOUNT_CACHE_TTL_SECONDS', '30'))
+account_cache_size = 1024
+
+_account_cache = OrderedDict()
+_lock = threading.Lock()
+_cache_hits = 0
+_cache_misses = 0
+
+def get_user_accounts(user_name):
+    """
+    Returns all account items belonging to 'user_name' from the 'user_accounts_table_name' DynamoDB table.
+    The result (including an empty one for unknown users) is cached for 'account_cache_ttl' seconds.
+    """
+    global _cache_hits, _cache_misses
+    with _lock:
+        entry = _account_cache.get(user_name)
+        if entry is not None and entry[0] > time.time():
+            _cache_hits += 1
+            return entry[1]
+        _cache_misses += 1
+
+    plans_table = get_dynamodb_resource().Table(user_accounts_table_name)
+    response = plans_table.query(KeyConditionExpression=Key('userName').eq(user_name))
+    items = response['Items']
+
+    with _lock:
+        _account_cache[user_name] = (time.time() + account_cache_ttl, items)
+        _account_cache.move_to_end(user_name)
+        while len(_account_cache) > account_cache_size:
+            _account_cache.popitem(last=False)
+
+    return items
+
+def account_cache_stats():
+    with _lock:
+        lookups = _cache_hits + _cache_misses
+        return {
+            'hits': _cache_hits,
+            'misses': _cache_misses,
+            'hit_rate': round(_cache_hits / lookups, 3) if lookups else 0.0
+        }
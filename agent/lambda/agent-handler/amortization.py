@@ -0,0 +1,216 @@
+import re
+import numpy as np
+from slot_parser import parse_number
+
+# Mortgage calculator for the LoanCalculator intent. Every function broadcasts over its arguments, so many scenarios
+# (rates x terms, extra payments) are computed as one NumPy expression instead of per-month Python loops.
+# Rates are annual percentages (5.735), terms are in years and payments are monthly.
+
+def monthly_rate(annual_rate):
+    return np.asarray(annual_rate, dtype=float) / 1200
+
+def monthly_payment(principal, annual_rate, years):
+    """
+    Returns the level monthly principal and interest payment.
+    """
+    principal = np.asarray(principal, dtype=float)
+    rate = monthly_rate(annual_rate)
+    months = np.asarray(years, dtype=float) * 12
+    with np.errstate(divide='ignore', invalid='ignore'):
+        payment = principal * rate / (1 - (1 + rate) ** -months)
+    # A zero rate has no interest: the principal is repaid in equal parts
+    return np.where(rate == 0, principal / months, payment)
+
+def remaining_balance(principal, annual_rate, payment, months_paid):
+    """
+    Returns the balance after 'months_paid' payments of 'payment', from the closed form of the amortization
+    recurrence, clipped at zero once the loan is paid off.
+    """
+    principal = np.asarray(principal, dtype=float)
+    rate = monthly_rate(annual_rate)
+    growth = (1 + rate) ** months_paid
+    with np.errstate(divide='ignore', invalid='ignore'):
+        balance = principal * growth - payment * (growth - 1) / rate
+    balance = np.where(rate == 0, principal - payment * months_paid, balance)
+    return np.maximum(balance, 0)
+
+def remaining_months(balance, annual_rate, payment):
+    """
+    Returns the number of payments of 'payment' still needed to pay off 'balance', rounded up.
+    """
+    balance = np.asarray(balance, dtype=float)
+    rate = monthly_rate(annual_rate)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        months = -np.log(1 - balance * rate / payment) / np.log(1 + rate)
+    return np.ceil(np.where(rate == 0, balance / payment, months))
+
+def amortization_schedule(principal, annual_rate, years, extra_payment=0.0):
+    """
+    Returns the month-by-month schedule as arrays of shape (..., months): 'payment', 'interest', 'principal' and
+    'balance' (after the payment), for any broadcastable mix of scenario arguments. Months after payoff are zero.
+    """
+    principal, annual_rate, years, extra_payment = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in (principal, annual_rate, years, extra_payment))
+    )
+    scheduled_payment = monthly_payment(principal, annual_rate, years)[..., None]
+    payment = scheduled_payment + extra_payment[..., None]
+
+    months = np.arange(int(np.max(years) * 12) + 1)
+    # Balance before each payment (column 0 is the original principal) and after it
+    balances = remaining_balance(principal[..., None], annual_rate[..., None], payment, months)
+    opening, closing = balances[..., :-1], balances[..., 1:]
+
+    interest = opening * monthly_rate(annual_rate)[..., None]
+    principal_paid = opening - closing
+    # Scenarios with shorter terms end early: beyond their term everything is zero
+    within_term = months[1:] <= (years * 12)[..., None]
+    return {
+        'payment': np.where(within_term & (opening > 0), interest + principal_paid, 0.0),
+        'interest': np.where(within_term, interest, 0.0),
+        'principal': np.where(within_term, principal_paid, 0.0),
+        'balance': np.where(within_term, closing, 0.0)
+    }
+
+def schedule_summary(schedule):
+    """
+    Returns the payoff month count and the total interest of each scenario of a schedule.
+    """
+    payoff_months = np.count_nonzero(schedule['payment'] > 0.005, axis=-1)
+    total_interest = schedule['interest'].sum(axis=-1)
+    return payoff_months, total_interest
+
+def extra_payment_savings(principal, annual_rate, years, extra_payments):
+    """
+    Compares paying 'extra_payments' (scalar or array) on top of the scheduled payment with the plain schedule.
+    Returns (months saved, interest saved) for each extra payment.
+    """
+    extra_payments = np.concatenate(([0.0], np.atleast_1d(np.asarray(extra_payments, dtype=float))))
+    payoff_months, total_interest = schedule_summary(amortization_schedule(principal, annual_rate, years, extra_payments))
+    return payoff_months[0] - payoff_months[1:], total_interest[0] - total_interest[1:]
+
+def refinance(balance, current_rate, remaining_years, new_rate, new_years, closing_costs=0.0):
+    """
+    Compares keeping the current loan with refinancing 'balance' at 'new_rate' over 'new_years'.
+    Returns the monthly saving, the months to recover the closing costs (inf if never) and the lifetime interest saved.
+    """
+    current_payment = monthly_payment(balance, current_rate, remaining_years)
+    new_payment = monthly_payment(balance, new_rate, new_years)
+    monthly_saving = current_payment - new_payment
+
+    current_interest = current_payment * np.asarray(remaining_years) * 12 - balance
+    new_interest = new_payment * np.asarray(new_years) * 12 - balance
+    with np.errstate(divide='ignore'):
+        break_even_months = np.where(monthly_saving > 0, np.ceil(closing_costs / monthly_saving), np.inf)
+    return monthly_saving, break_even_months, current_interest - new_interest - closing_costs
+
+def rate_term_grid(principal, annual_rates, terms):
+    """
+    Returns the monthly payment and total interest for every rate x term combination, as (rates, terms) arrays.
+    """
+    annual_rates = np.asarray(annual_rates, dtype=float)[:, None]
+    terms = np.asarray(terms, dtype=float)[None, :]
+    payments = monthly_payment(principal, annual_rates, terms)
+    return payments, payments * terms * 12 - principal
+
+# --- Conversation ---
+
+RATE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(?:%|percent)")
+TERM_PATTERN = re.compile(r"(\d+)\s*(?:-\s*)?(?:years?|yrs?|yr)\b")
+EXTRA_PATTERN = re.compile(r"extra\s+(\$?[\d,.]+k?)")
+AMOUNT_PATTERN = re.compile(r"\$\s*[\d,.]+\s*[km]?\b|\b\d[\d,.]*\s*[km]\b|\b\d{1,3}(?:,\d{3})+\b|\b\d{5,}\b")
+
+def parse_calculator_request(transcript):
+    """
+    Extracts the loan amount, rate, term, extra payment and refinance rate mentioned in an utterance such as
+    'What would $400k at 6.5% for 30 years cost with an extra $200?'. Missing values are None.
+    """
+    text = (transcript or '').lower()
+    request = {'loanAmount': None, 'loanInterest': None, 'loanDuration': None, 'extraPayment': None, 'refinanceRate': None}
+
+    rates = [float(rate) for rate in RATE_PATTERN.findall(text)]
+    if 'refinanc' in text and rates:
+        request['refinanceRate'] = rates.pop()
+    if rates:
+        request['loanInterest'] = rates[0]
+
+    term = TERM_PATTERN.search(text)
+    if term:
+        request['loanDuration'] = int(term.group(1))
+
+    extra = EXTRA_PATTERN.search(text)
+    if extra:
+        request['extraPayment'] = parse_number(extra.group(1))
+        text = text[:extra.start()] + text[extra.end():]
+
+    amount = AMOUNT_PATTERN.search(RATE_PATTERN.sub(' ', text))
+    if amount:
+        request['loanAmount'] = parse_number(amount.group(0).replace(' ', ''))
+    return request
+
+# Accepted ranges of the calculator inputs; anything outside is re-asked rather than computed (a schedule allocates
+# one column per month, so the term bounds the work per request)
+LOAN_AMOUNT_RANGE = (1000, 100000000)
+RATE_RANGE = (0, 30)
+TERM_RANGE = (1, 50)
+
+def validate_loan(principal, annual_rate, years, extra_payment=None, refinance_rate=None):
+    """
+    Returns a message describing the first value outside its accepted range, or None if all values are usable.
+    """
+    if not LOAN_AMOUNT_RANGE[0] <= principal <= LOAN_AMOUNT_RANGE[1]:
+        return f"The loan amount must be between {format_money(LOAN_AMOUNT_RANGE[0])} and {format_money(LOAN_AMOUNT_RANGE[1])}."
+    if not RATE_RANGE[0] <= annual_rate <= RATE_RANGE[1]:
+        return f"The interest rate must be between {RATE_RANGE[0]}% and {RATE_RANGE[1]}%."
+    if refinance_rate is not None and not RATE_RANGE[0] <= refinance_rate <= RATE_RANGE[1]:
+        return f"The refinance rate must be between {RATE_RANGE[0]}% and {RATE_RANGE[1]}%."
+    if years != int(years) or not TERM_RANGE[0] <= years <= TERM_RANGE[1]:
+        return f"The loan term must be a whole number of years between {TERM_RANGE[0]} and {TERM_RANGE[1]}."
+    if extra_payment is not None and not 0 <= extra_payment <= principal:
+        return "The extra monthly payment must be between $0 and the loan amount."
+    return None
+
+def format_money(value):
+    return f"${value:,.2f}"
+
+def format_duration(months):
+    years, months = divmod(int(months), 12)
+    parts = [f"{count} {unit}{'s' if count != 1 else ''}" for count, unit in ((years, 'year'), (months, 'month')) if count]
+    return " ".join(parts) or "0 months"
+
+def describe_loan(principal, annual_rate, years, extra_payment=None, refinance_rate=None, unpaid_principal=None):
+    """
+    Builds the calculator reply: payment and total interest, an extra-payment what-if, a refinance what-if and a
+    rate x term comparison grid.
+    """
+    payment = float(monthly_payment(principal, annual_rate, years))
+    total_interest = payment * years * 12 - principal
+    lines = [
+        f"For a {format_money(principal)} loan at {annual_rate:g}% over {years} years, the monthly principal and interest "
+        f"payment is {format_money(payment)}, with {format_money(total_interest)} of total interest."
+    ]
+
+    extra_payments = [extra_payment] if extra_payment else [100, 250, 500]
+    months_saved, interest_saved = extra_payment_savings(principal, annual_rate, years, extra_payments)
+    lines.append("Paying extra each month: " + "; ".join(
+        f"{format_money(extra)} pays it off {format_duration(saved_months)} sooner and saves {format_money(saved)} in interest"
+        for extra, saved_months, saved in zip(extra_payments, months_saved, interest_saved)
+    ) + ".")
+
+    # The refinance keeps the remaining term, so the comparison is only about the rate
+    balance = unpaid_principal or principal
+    remaining_years = float(remaining_months(balance, annual_rate, payment)) / 12
+    new_rate = refinance_rate if refinance_rate is not None else max(annual_rate - 1, 0)
+    monthly_saving, break_even, refinance_saving = refinance(balance, annual_rate, remaining_years, new_rate, remaining_years, closing_costs=0.02 * balance)
+    if monthly_saving > 0:
+        lines.append(
+            f"Refinancing {format_money(balance)} at {new_rate:g}% would lower the payment by {format_money(float(monthly_saving))} a month; "
+            f"estimated 2% closing costs are recovered in {format_duration(break_even)} and lifetime interest drops by {format_money(float(refinance_saving))}."
+        )
+
+    rates = np.round(np.arange(annual_rate - 1, annual_rate + 1.01, 0.5), 3)
+    rates = rates[rates > 0]
+    terms = [15, 20, 30]
+    payments, _ = rate_term_grid(principal, rates, terms)
+    lines.append("Monthly payment by rate and term (" + " / ".join(f"{term} yr" for term in terms) + "):")
+    lines.extend(f"{rate:g}%: " + " / ".join(format_money(value) for value in row) for rate, row in zip(rates, payments))
+    return "\n".join(lines)
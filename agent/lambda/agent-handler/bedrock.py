@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import bisect
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from clients import get_bedrock_runtime
+from deadline import DeadlineExceeded, remaining
+from tracing import annotate, propagate, span
+
+# Shared Bedrock invocation layer. The client itself (timeouts, adaptive retries, connection pool) is configured in
+# clients.get_bedrock_runtime. When the primary model has produced no output after 'hedge_after_ms' (or fails, e.g.
+# throttled after retries), the same request is also sent to the faster hedge model and whichever produces output
+# first is used.
+primary_model_id = os.environ.get('BEDROCK_PRIMARY_MODEL', 'anthropic.claude-3-sonnet-20240229-v1:0')
+hedge_model_id = os.environ.get('BEDROCK_HEDGE_MODEL', 'anthropic.claude-3-haiku-20240307-v1:0')
+hedge_after_ms = float(os.environ.get('BEDROCK_HEDGE_AFTER_MS', '0'))
+# How long past the request deadline a stream may take to return the answer it has received so far
+stream_grace_ms = float(os.environ.get('BEDROCK_STREAM_GRACE_MS', '250'))
+
+# Hedged attempts run here, so they never wait on the request's own tasks in pipeline.executor
+_executor = ThreadPoolExecutor(max_workers=4)
+
+LATENCY_BUCKETS_MS = [100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000]
+
+def truncate_to_sentence(text):
+    """
+    Trims a partial answer back to its last complete sentence or line, or to its last complete word when that would
+    drop more than half of the text.
+    """
+    cut = max(text.rfind(marker) for marker in ('. ', '! ', '? ', '\n'))
+    if cut < len(text) // 2:
+        cut = text.rfind(' ')
+        return text[:cut].rstrip() if cut > 0 else text.rstrip()
+    return text[:cut + 1].rstrip()
+
+class LatencyHistogram:
+    """
+    Bucketed latency counts for one model, kept for the lifetime of the container.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency_ms):
+        with self.lock:
+            self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+            self.total += 1
+
+    def percentile(self, fraction):
+        """
+        Returns the upper bound of the bucket holding the given fraction of calls (None above the last bucket).
+        """
+        with self.lock:
+            counts, total = list(self.counts), self.total
+        threshold, seen = fraction * total, 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if total and seen >= threshold:
+                return LATENCY_BUCKETS_MS[bucket] if bucket < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+    def summary(self):
+        with self.lock:
+            counts, total = list(self.counts), self.total
+        buckets = {f"<={bound}ms": count for bound, count in zip(LATENCY_BUCKETS_MS, counts) if count}
+        if counts[-1]:
+            buckets[f">{LATENCY_BUCKETS_MS[-1]}ms"] = counts[-1]
+        return {'calls': total, 'p50_ms': self.percentile(0.5), 'p95_ms': self.percentile(0.95), 'buckets': buckets}
+
+# Keyed by (model id, 'first_output' | 'total')
+latency_histograms = {}
+_histograms_lock = threading.Lock()
+
+def record_latency(model_id, kind, latency_ms):
+    with _histograms_lock:
+        histogram = latency_histograms.setdefault((model_id, kind), LatencyHistogram())
+    histogram.record(latency_ms)
+
+def latency_summary():
+    with _histograms_lock:
+        histograms = dict(latency_histograms)
+    return {f"{model_id}.{kind}": histogram.summary() for (model_id, kind), histogram in sorted(histograms.items())}
+
+class _Race:
+    """
+    Decides which attempt of a hedged request is used: the first one to produce output.
+    'settled' is set as soon as any attempt produces output or fails.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.winner = None
+        self.settled = threading.Event()
+
+    def claim(self, model_id):
+        with self.lock:
+            if self.winner is None:
+                self.winner = model_id
+            won = self.winner == model_id
+        self.settled.set()
+        return won
+
+def _invoke(body, model_id, race, usage):
+    start_time = time.perf_counter()
+    response = get_bedrock_runtime().invoke_model(
+        body=body,
+        modelId=model_id,
+        accept="application/json",
+        contentType="application/json"
+    )
+    payload = json.loads(response['body'].read())
+    answer = payload['content'][0]['text']
+    usage.update(payload.get('usage', {}), cut_short=payload.get('stop_reason') == 'max_tokens')
+    latency_ms = (time.perf_counter() - start_time) * 1000
+    record_latency(model_id, 'first_output', latency_ms)
+    record_latency(model_id, 'total', latency_ms)
+    return answer if race.claim(model_id) else None
+
+def _invoke_stream(body, model_id, race, usage, max_chars=0, deadline=None):
+    """
+    Streams an answer, stopping early once 'max_chars' characters have been received or 'deadline' has passed.
+    Returns None, without reading further, if another attempt produced output first.
+    """
+    start_time = time.perf_counter()
+    response = get_bedrock_runtime().invoke_model_with_response_stream(
+        body=body,
+        modelId=model_id,
+        accept="application/json",
+        contentType="application/json"
+    )
+
+    stream = response['body']
+    chunks = []
+    received_chars = 0
+    first_token_latency = None
+    truncated = False
+    # Stopped by max_tokens or the deadline rather than by the model or the configured 'max_chars'
+    cut_short = False
+
+    try:
+        for event in stream:
+            chunk = json.loads(event['chunk']['bytes'])
+            if chunk['type'] == 'content_block_delta':
+                if first_token_latency is None:
+                    first_token_latency = time.perf_counter() - start_time
+                    record_latency(model_id, 'first_output', first_token_latency * 1000)
+                    if not race.claim(model_id):
+                        # The prompt and the first chunk are billed although the answer is not used
+                        text = chunk['delta'].get('text', '')
+                        usage.update(input_tokens=len(body) // 4, output_tokens=len(text) // 4, estimated=True)
+                        return None
+                text = chunk['delta'].get('text', '')
+                chunks.append(text)
+                received_chars += len(text)
+                if max_chars and received_chars >= max_chars:
+                    truncated = True
+                    break
+                # Out of time: answer with what has arrived so far
+                if deadline is not None and deadline.expired():
+                    truncated = cut_short = True
+                    break
+            elif chunk['type'] == 'message_delta' and chunk['delta'].get('stop_reason') == 'max_tokens':
+                truncated = cut_short = True
+            elif chunk['type'] == 'message_stop' and 'amazon-bedrock-invocationMetrics' in chunk:
+                metrics = chunk['amazon-bedrock-invocationMetrics']
+                usage.update(input_tokens=metrics.get('inputTokenCount', 0), output_tokens=metrics.get('outputTokenCount', 0))
+                annotate(Tokens=metrics.get('inputTokenCount', 0) + metrics.get('outputTokenCount', 0))
+    finally:
+        # Closing the stream early stops generation from being read any further
+        stream.close()
+
+    total_latency = time.perf_counter() - start_time
+    record_latency(model_id, 'total', total_latency * 1000)
+
+    answer = "".join(chunks)
+    # A stream closed early never receives its metrics; estimate at 4 characters per token
+    if 'output_tokens' not in usage:
+        usage.update(input_tokens=len(body) // 4, output_tokens=received_chars // 4, estimated=True)
+    usage['cut_short'] = cut_short
+    if truncated:
+        answer = truncate_to_sentence(answer[:max_chars] if max_chars else answer)
+
+    print(f"Bedrock stream {model_id}: first token {(first_token_latency or 0) * 1000:.0f} ms, total {total_latency * 1000:.0f} ms, {received_chars} chars, truncated={truncated}")
+
+    return answer
+
+def _attempt(body, model_id, race, usage, stream, max_chars, deadline):
+    try:
+        with span('bedrock_attempt', Model=model_id, Streaming=stream):
+            if stream:
+                return _invoke_stream(body, model_id, race, usage, max_chars, deadline)
+            return _invoke(body, model_id, race, usage)
+    except Exception:
+        race.settled.set()
+        raise
+
+def _loser_usage(model_id, usage, body):
+    """
+    Returns the billed usage of an attempt that lost the race. An attempt still running when the winner answered
+    has reported nothing yet, so only its input is counted, estimated at 4 characters per token.
+    """
+    if 'input_tokens' in usage:
+        return dict(usage, model=model_id)
+    return {'model': model_id, 'input_tokens': len(body) // 4, 'output_tokens': 0, 'estimated': True}
+
+def invoke(body, model_id=None, stream=False, max_chars=0, hedge_model=None, hedge_after=None, deadline=None, usage=None):
+    """
+    Sends an Anthropic Messages API 'body' (a dict or JSON string) to Bedrock and returns the answer text.
+    The request is hedged to 'hedge_model' (default BEDROCK_HEDGE_MODEL) when the primary model has produced no
+    output after 'hedge_after' milliseconds (default BEDROCK_HEDGE_AFTER_MS, 0 disables hedging) or has failed.
+    With a 'deadline', a stream returns its partial answer when time runs out and a call that has not answered by
+    then raises DeadlineExceeded.
+    If a 'usage' dict is given, it receives the answering 'model', its 'input_tokens' and 'output_tokens', and
+    'cut_short' when the answer was stopped by max_tokens or the deadline. Its 'hedged' list holds the usage of
+    each losing attempt, which is billed as well (see _loser_usage).
+    """
+    model_id = model_id or primary_model_id
+    hedge_model = hedge_model_id if hedge_model is None else hedge_model
+    hedge_after = hedge_after_ms if hedge_after is None else hedge_after
+    if not isinstance(body, str):
+        body = json.dumps(body)
+
+    if deadline is not None:
+        deadline.check('bedrock')
+
+    start_time = time.perf_counter()
+    race = _Race()
+    # Token usage of each attempt, by model
+    usages = {model_id: {}, hedge_model: {}}
+    primary = _executor.submit(propagate(_attempt), body, model_id, race, usages[model_id], stream, max_chars, deadline)
+    attempts = {primary: model_id}
+
+    if hedge_model and hedge_model != model_id and hedge_after > 0:
+        wait = hedge_after / 1000
+        if deadline is not None:
+            wait = deadline.timeout(wait)
+        race.settled.wait(wait)
+        if race.winner is None:
+            reason = 'failed' if primary.done() else f"no output after {hedge_after:.0f} ms"
+            print(f"Hedging Bedrock request from {model_id} to {hedge_model}: primary {reason}")
+            attempts[_executor.submit(propagate(_attempt), body, hedge_model, race, usages[hedge_model], stream, max_chars, deadline)] = hedge_model
+
+    # A stream stops by itself at the deadline; the grace lets it hand back its partial answer
+    timeout = remaining(deadline)
+    if timeout is not None and stream:
+        timeout += stream_grace_ms / 1000
+
+    errors = []
+    try:
+        for future in as_completed(attempts, timeout=timeout):
+            try:
+                answer = future.result()
+            except Exception as e:
+                print(f"Bedrock {attempts[future]} error: {e}")
+                errors.append(e)
+                continue
+            if answer is not None:
+                print(f"Bedrock answer from {attempts[future]} in {(time.perf_counter() - start_time) * 1000:.0f} ms; latency histograms: {latency_summary()}")
+                if usage is not None:
+                    usage.update(usages[attempts[future]], model=attempts[future])
+                    # A failed attempt is not billed
+                    usage['hedged'] = [_loser_usage(other, usages[other], body) for attempt, other in attempts.items()
+                                       if attempt is not future and not (attempt.done() and attempt.exception() is not None)]
+                return answer
+    except TimeoutError:
+        print(f"Bedrock {', '.join(attempts.values())}: no answer before the deadline")
+        raise DeadlineExceeded('bedrock')
+
+    raise errors[0]
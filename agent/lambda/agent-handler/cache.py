@@ -0,0 +1,187 @@
+import os
+import re
+import math
+import time
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from clients import get_dynamodb_client
+
+# Words that do not change the meaning of an FAQ question and only fragment the cache key space
+FILLER_WORDS = {'a', 'an', 'the', 'please', 'can', 'could', 'you', 'tell', 'me', 'i', 'would', 'like', 'to', 'know', 'about'}
+EMBEDDING_DIMENSIONS = 256
+
+def normalize_question(question):
+    """
+    Normalizes question text so that trivially different phrasings share a cache key.
+    """
+    words = re.sub(r"[^a-z0-9\s]", " ", str(question).lower()).split()
+    meaningful_words = [word for word in words if word not in FILLER_WORDS]
+    return " ".join(meaningful_words or words)
+
+def embed(text, dimensions=EMBEDDING_DIMENSIONS):
+    """
+    Computes a local, dependency-free embedding from hashed character trigrams (L2-normalized).
+    """
+    vector = [0.0] * dimensions
+    padded = " " + text + " "
+    for i in range(len(padded) - 2):
+        vector[zlib.crc32(padded[i:i + 3].encode('utf-8')) % dimensions] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+def cosine_similarity(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+class InMemoryCacheBackend:
+    """
+    In-process LRU cache with per-entry TTL. Survives across warm Lambda invocations.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.time() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+class DynamoDBCacheBackend:
+    """
+    Shared cache stored in a DynamoDB table keyed on 'id', expired by the table's TTL attribute 'expires_at'.
+    """
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.dynamodb = get_dynamodb_client()
+        self.evictions = 0
+
+    def get(self, key):
+        response = self.dynamodb.get_item(TableName=self.table_name, Key={'id': {'S': key}})
+        item = response.get('Item')
+        # DynamoDB TTL deletion is lazy, so expired items may still be returned
+        if item is None or int(item['expires_at']['N']) < time.time():
+            return None
+        return item['answer']['S']
+
+    def put(self, key, value, ttl):
+        self.dynamodb.put_item(
+            TableName=self.table_name,
+            Item={
+                'id': {'S': key},
+                'answer': {'S': value},
+                'expires_at': {'N': str(int(time.time() + ttl))}
+            }
+        )
+
+class AnswerCache:
+    """
+    Answer cache keyed on normalized question text, with an optional embedding similarity tier.
+    """
+
+    def __init__(self, backend, ttl=3600, similarity_threshold=0.0, max_vectors=256):
+        self.backend = backend
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.max_vectors = max_vectors
+        self.vectors = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def key(self, normalized_question):
+        return hashlib.sha256(normalized_question.encode('utf-8')).hexdigest()
+
+    def get(self, question):
+        """
+        Returns the cached answer for the question, or None on a miss.
+        """
+        normalized_question = normalize_question(question)
+        answer = self.backend.get(self.key(normalized_question))
+        if answer is not None:
+            self.hits += 1
+            return answer
+
+        if self.similarity_threshold > 0:
+            similar_key = self.find_similar(normalized_question)
+            if similar_key is not None:
+                answer = self.backend.get(similar_key)
+                if answer is not None:
+                    self.similar_hits += 1
+                    return answer
+
+        self.misses += 1
+        return None
+
+    def put(self, question, answer):
+        normalized_question = normalize_question(question)
+        key = self.key(normalized_question)
+        self.backend.put(key, answer, self.ttl)
+
+        if self.similarity_threshold > 0:
+            with self.lock:
+                self.vectors[key] = embed(normalized_question)
+                self.vectors.move_to_end(key)
+                while len(self.vectors) > self.max_vectors:
+                    self.vectors.popitem(last=False)
+
+    def find_similar(self, normalized_question):
+        query_vector = embed(normalized_question)
+        best_key, best_score = None, self.similarity_threshold
+        with self.lock:
+            for key, vector in self.vectors.items():
+                score = cosine_similarity(query_vector, vector)
+                if score >= best_score:
+                    best_key, best_score = key, score
+        return best_key
+
+    def stats(self):
+        lookups = self.hits + self.similar_hits + self.misses
+        return {
+            'hits': self.hits,
+            'similar_hits': self.similar_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.similar_hits) / lookups, 3) if lookups else 0.0,
+            'evictions': self.backend.evictions
+        }
+
+def create_answer_cache():
+    """
+    Builds the answer cache from environment configuration. Returns None when caching is disabled.
+    """
+    backend_name = os.environ.get('ANSWER_CACHE_BACKEND', 'memory').lower()
+    max_entries = int(os.environ.get('ANSWER_CACHE_MAX_ENTRIES', '256'))
+
+    if backend_name == 'dynamodb':
+        backend = DynamoDBCacheBackend(os.environ['ANSWER_CACHE_TABLE'])
+    elif backend_name == 'memory':
+        backend = InMemoryCacheBackend(max_entries)
+    else:
+        return None
+
+    return AnswerCache(
+        backend,
+        ttl=int(os.environ.get('ANSWER_CACHE_TTL_SECONDS', '3600')),
+        similarity_threshold=float(os.environ.get('ANSWER_CACHE_SIMILARITY_THRESHOLD', '0')),
+        max_vectors=max_entries
+    )
@@ -1,26 +1,31 @@
 from boto3.dynamodb.types import TypeSerializer
 from langchain.memory.chat_message_histories import DynamoDBChatMessageHistory
 from langchain.memory import ConversationBufferMemory
+from chat_history import WindowedDynamoDBChatMessageHistory
 from datetime import datetime
+from clients import get_dynamodb_client
 import json
-import boto3
 import os
 
-now = datetime.utcnow()
-dynamodb = boto3.client('dynamodb')
 ts = TypeSerializer()
 
 # Create reference to DynamoDB tables
 conversation_index_table_name = os.environ.get('CONVERSATION_INDEX_TABLE')
 conversation_table_name = os.environ.get('CONVERSATION_TABLE')
 
+# 'buffer' keeps the full history in one ever-growing item; 'window' bounds the per-turn read, write and prompt size
+chat_memory_mode = os.environ.get('CHAT_MEMORY_MODE', 'buffer').lower()
+chat_memory_window = int(os.environ.get('CHAT_MEMORY_WINDOW', '10'))
+chat_memory_max_tokens = int(os.environ.get('CHAT_MEMORY_MAX_TOKENS', '1000'))
+chat_memory_chunk_size = int(os.environ.get('CHAT_MEMORY_CHUNK_SIZE', '50'))
+chat_memory_summary_words = int(os.environ.get('CHAT_MEMORY_SUMMARY_WORDS', '100'))
+
 class Chat():
 
     def __init__(self, event, session_id):
         print(f"Initializing FSI Agent chat with session ID: {session_id}")
         self.set_user_id(event)
         self.set_session_id(session_id)
-        self.set_chat_index()
         self.set_memory(event, session_id)
         self.create_new_chat()
 
@@ -31,7 +36,19 @@ class Chat():
         conversation_id = self.session_id
         
         # Set up conversation history
-        self.message_history = DynamoDBChatMessageHistory(table_name=conversation_table_name, session_id=conversation_id)
+        if chat_memory_mode == 'window':
+            # Reuse the loaded history window when recording the Assistant's reply in the same turn
+            if getattr(self, 'message_history', None) is None or self.message_history.session_id != conversation_id:
+                self.message_history = WindowedDynamoDBChatMessageHistory(
+                    table_name=conversation_table_name,
+                    session_id=conversation_id,
+                    window_size=chat_memory_window,
+                    max_tokens=chat_memory_max_tokens,
+                    chunk_size=chat_memory_chunk_size,
+                    summary_words=chat_memory_summary_words
+                )
+        else:
+            self.message_history = DynamoDBChatMessageHistory(table_name=conversation_table_name, session_id=conversation_id)
         if 'Human' in event:
             self.message_history.add_user_message(event['Human'])
         elif 'Assistant' in event:
@@ -47,21 +64,24 @@ class Chat():
             return_messages=True
         )
 
-    def get_chat_index(self):
-        key = {'id':self.user_id}
-        chat_index = dynamodb.get_item(TableName=conversation_index_table_name, Key=ts.serialize(key)['M'])
-        if 'Item' in chat_index:
-            return int(chat_index['Item']['chat_index']['N'])
-        return 0
-
     def increment_chat_index(self):
-        self.chat_index += 1
-        input = {
-            'id': self.user_id,
-            'chat_index': self.chat_index,
-            'updated_at': str(now)
-        }
-        dynamodb.put_item(TableName=conversation_index_table_name, Item=ts.serialize(input)['M'])
+        """
+        Atomically increments the user's chat index in a single round-trip and returns the new value.
+        Unlike a get_item/put_item pair, concurrent invocations for the same user cannot lose updates.
+        """
+        key = {'id': self.user_id}
+        response = get_dynamodb_client().update_item(
+            TableName=conversation_index_table_name,
+            Key=ts.serialize(key)['M'],
+            UpdateExpression='ADD chat_index :increment SET updated_at = :updated_at',
+            ExpressionAttributeValues={
+                ':increment': {'N': '1'},
+                ':updated_at': {'S': str(datetime.utcnow())}
+            },
+            ReturnValues='UPDATED_NEW'
+        )
+        self.chat_index = int(response['Attributes']['chat_index']['N'])
+        return self.chat_index
 
     def create_new_chat(self):
         self.increment_chat_index()
@@ -71,6 +91,3 @@ class Chat():
 
     def set_session_id(self, session_id):
         self.session_id = session_id
-
-    def set_chat_index(self):
-        self.chat_index = self.get_chat_index()
\ No newline at end of file
@@ -0,0 +1,91 @@
+from langchain.schema import BaseChatMessageHistory
+from langchain.schema.messages import SystemMessage, messages_from_dict, messages_to_dict
+from summarizer import extractive_summary
+from clients import get_dynamodb_resource
+
+class WindowedDynamoDBChatMessageHistory(BaseChatMessageHistory):
+    """
+    Chat message history with bounded per-turn cost, stored in the conversation table as:
+    - a head item ('<session>#head') holding the recent message window, an extractive digest of older turns and a message count
+    - append-only archive items ('<session>#<n>') holding at most 'chunk_size' messages each
+    Each turn reads only the head item and writes the head plus one archive chunk, so DynamoDB item sizes
+    and prompt tokens stay flat however long the conversation gets.
+    """
+
+    def __init__(self, table_name, session_id, window_size=10, max_tokens=1000, chunk_size=50, summary_words=100):
+        self.table = get_dynamodb_resource().Table(table_name)
+        self.session_id = session_id
+        self.window_size = window_size
+        self.max_tokens = max_tokens
+        self.chunk_size = chunk_size
+        self.summary_words = summary_words
+        self.head = None
+
+    def load_head(self):
+        if self.head is None:
+            response = self.table.get_item(Key={'SessionId': f"{self.session_id}#head"})
+            self.head = response.get('Item') or {'Recent': [], 'Summary': '', 'MessageCount': 0}
+        return self.head
+
+    @property
+    def messages(self):
+        """
+        Returns the digest of older turns (as a system message) followed by the most recent messages within the token budget.
+        """
+        head = self.load_head()
+        recent = messages_from_dict(head['Recent'])
+
+        # Approximate tokens as 4 characters, dropping the oldest messages first
+        budget = self.max_tokens * 4 - len(head['Summary'])
+        window = []
+        for message in reversed(recent):
+            budget -= len(message.content)
+            if budget < 0 and window:
+                break
+            window.insert(0, message)
+
+        if head['Summary']:
+            return [SystemMessage(content=f"Summary of earlier conversation: {head['Summary']}")] + window
+        return window
+
+    def add_message(self, message):
+        head = self.load_head()
+        message_count = int(head['MessageCount'])
+        serialized_message = messages_to_dict([message])
+
+        # Messages that fall out of the window are folded into the digest kept in 'Summary'
+        recent = head['Recent'] + serialized_message
+        evicted, recent = recent[:-self.window_size], recent[-self.window_size:]
+        summary = head['Summary']
+        if evicted:
+            # Each evicted message keeps only its leading sentences (at most 25 words, no LLM call), one entry per line.
+            # Whole oldest entries are dropped until the digest fits 'summary_words', so no entry is ever cut mid-way.
+            entries = [entry for entry in summary.split("\n") if entry]
+            entries += [f"{entry['type']}: {extractive_summary(entry['data']['content'], 25)}" for entry in evicted]
+            word_count = sum(len(entry.split()) for entry in entries)
+            while entries and word_count > self.summary_words:
+                word_count -= len(entries.pop(0).split())
+            summary = "\n".join(entries)
+
+        self.head = {
+            'SessionId': f"{self.session_id}#head",
+            'Recent': recent,
+            'Summary': summary,
+            'MessageCount': message_count + 1
+        }
+        self.table.put_item(Item=self.head)
+
+        # The full transcript is kept in fixed-size archive chunks that are never read on the request path
+        self.table.update_item(
+            Key={'SessionId': f"{self.session_id}#{message_count // self.chunk_size}"},
+            UpdateExpression='SET History = list_append(if_not_exists(History, :empty), :message)',
+            ExpressionAttributeValues={':empty': [], ':message': serialized_message}
+        )
+
+    def clear(self):
+        head = self.load_head()
+        chunk_count = int(head['MessageCount']) // self.chunk_size + 1
+        for chunk in range(chunk_count):
+            self.table.delete_item(Key={'SessionId': f"{self.session_id}#{chunk}"})
+        self.table.delete_item(Key={'SessionId': f"{self.session_id}#head"})
+        self.head = None
@@ -0,0 +1,53 @@
+import os
+import boto3
+import threading
+from botocore.config import Config
+from tracing import instrument_client
+
+# boto3 clients are expensive to construct, so one of each is created per Lambda container and reused by warm invocations
+_clients = {}
+_lock = threading.Lock()
+_session = None
+
+def get_session():
+    global _session
+    if _session is None:
+        _session = boto3.Session(region_name=os.environ['AWS_REGION'])
+    return _session
+
+def _get_or_create(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        # boto3 sessions are not thread-safe, so construction is serialized
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory(get_session())
+                instrument_client(client)
+                _clients[name] = client
+    return client
+
+def get_dynamodb_resource():
+    return _get_or_create('dynamodb_resource', lambda session: session.resource('dynamodb'))
+
+def get_dynamodb_client():
+    return _get_or_create('dynamodb', lambda session: session.client('dynamodb'))
+
+def get_s3_client():
+    return _get_or_create('s3', lambda session: session.client('s3', config=boto3.session.Config(signature_version='s3v4')))
+
+# Explicit timeouts and adaptive (client-side rate limited) retries, so a throttled or stalled model call fails fast
+# enough for bedrock.invoke to hedge within the Lex time limit. The pool covers the agent, streaming and hedged calls.
+bedrock_config = Config(
+    connect_timeout=float(os.environ.get('BEDROCK_CONNECT_TIMEOUT', '2')),
+    read_timeout=float(os.environ.get('BEDROCK_READ_TIMEOUT', '20')),
+    retries={'max_attempts': int(os.environ.get('BEDROCK_MAX_ATTEMPTS', '3')), 'mode': 'adaptive'},
+    max_pool_connections=int(os.environ.get('BEDROCK_MAX_POOL_CONNECTIONS', '10')),
+    tcp_keepalive=True
+)
+
+def get_bedrock_runtime():
+    return _get_or_create('bedrock-runtime', lambda session: session.client('bedrock-runtime', config=bedrock_config))
+
+def get_kendra():
+    return _get_or_create('kendra', lambda session: session.client('kendra'))
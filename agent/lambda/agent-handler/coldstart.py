@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import builtins
+
+# Import-time profiler for cold start analysis. Enable with COLDSTART_PROFILE=true; it must be installed
+# before the modules it should measure are imported, so lambda_function imports this module first.
+profile_enabled = os.environ.get('COLDSTART_PROFILE', 'false').lower() == 'true'
+init_started_at = time.perf_counter()
+
+# module name -> [cumulative seconds, seconds spent in nested imports, nesting depth when first imported]
+import_timings = {}
+_import_stack = []
+_original_import = builtins.__import__
+_reported_count = 0
+_init_duration = None
+
+def _profiled_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # Relative and already-loaded imports cost nothing worth measuring
+    if level or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    _import_stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = _import_stack.pop()
+        if name not in import_timings:
+            import_timings[name] = [elapsed, nested, len(_import_stack)]
+        if _import_stack:
+            _import_stack[-1] += elapsed
+
+def install():
+    """
+    Starts recording the wall time of every first-time import.
+    """
+    if builtins.__import__ is not _profiled_import:
+        builtins.__import__ = _profiled_import
+
+def mark_init_complete():
+    """
+    Records the end of the module initialization phase (called on the first handler invocation).
+    """
+    global _init_duration
+    if _init_duration is None:
+        _init_duration = time.perf_counter() - init_started_at
+
+def report(limit=15):
+    """
+    Prints the cold start breakdown by module, if new imports happened since the last report.
+    Lazily loaded dependencies show up in the report of the first invocation that needed them.
+    """
+    global _reported_count
+    if not profile_enabled or len(import_timings) == _reported_count:
+        return
+    _reported_count = len(import_timings)
+
+    # Top-level imports carry the cost of everything they pull in; self time excludes nested imports
+    top_level = [(name, timing) for name, timing in import_timings.items() if timing[2] == 0]
+    top_level.sort(key=lambda entry: entry[1][0], reverse=True)
+
+    lines = [f"Cold start report: init {(_init_duration or 0) * 1000:.0f} ms, {len(import_timings)} modules imported"]
+    for name, (cumulative, nested, depth) in top_level[:limit]:
+        lines.append(f"  {name}: {cumulative * 1000:.1f} ms cumulative, {(cumulative - nested) * 1000:.1f} ms self")
+    print("\n".join(lines))
+
+if profile_enabled:
+    install()
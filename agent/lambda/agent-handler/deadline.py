@@ -0,0 +1,96 @@
+import os
+import time
+from concurrent.futures import TimeoutError
+from pipeline import executor
+from tracing import propagate
+
+# Per-request time budget derived from the Lambda context. Downstream calls (Kendra, Bedrock, S3) wait at most until
+# the deadline and Bedrock's max_tokens shrinks to what can still be generated, so a slow stage produces a short or
+# partial answer instead of a Lambda timeout, which Lex shows as a generic error.
+# DEADLINE_RESERVE_MS is kept back for the work after the last downstream call (memory update, building the response).
+deadline_reserve_ms = float(os.environ.get('DEADLINE_RESERVE_MS', '1500'))
+# Used to size max_tokens to the remaining time
+first_token_ms = float(os.environ.get('BEDROCK_FIRST_TOKEN_MS', '1500'))
+output_tokens_per_second = float(os.environ.get('BEDROCK_OUTPUT_TOKENS_PER_SECOND', '40'))
+min_answer_tokens = int(os.environ.get('BEDROCK_MIN_TOKENS', '64'))
+
+TIMEOUT_MESSAGE = "I'm sorry, finding that answer is taking longer than expected. Please try asking again in a moment."
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a stage cannot start or finish before the request deadline.
+    """
+
+    def __init__(self, stage):
+        super().__init__(f"Deadline exceeded before {stage} completed")
+        self.stage = stage
+
+class Deadline:
+
+    def __init__(self, budget_ms):
+        self.expires_at = time.monotonic() + max(budget_ms, 0) / 1000
+
+    @classmethod
+    def from_context(cls, context, reserve_ms=None):
+        """
+        Returns the deadline of the current invocation, or None when there is no Lambda context (e.g. local runs).
+        """
+        if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+            return None
+        reserve_ms = deadline_reserve_ms if reserve_ms is None else reserve_ms
+        return cls(context.get_remaining_time_in_millis() - reserve_ms)
+
+    def remaining(self):
+        """
+        Returns the remaining seconds, never negative.
+        """
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, stage):
+        if self.expired():
+            raise DeadlineExceeded(stage)
+
+    def timeout(self, cap=None):
+        """
+        Returns the seconds a stage may wait: the remaining time, capped at 'cap' seconds.
+        """
+        remaining = self.remaining()
+        return min(remaining, cap) if cap is not None else remaining
+
+def remaining(deadline):
+    """
+    Returns the remaining seconds of 'deadline', or None (no limit) without one.
+    """
+    return deadline.remaining() if deadline is not None else None
+
+def run_with_deadline(deadline, stage, function, *args, cap=None, **kwargs):
+    """
+    Calls 'function', waiting at most until 'deadline' (and at most 'cap' seconds); raises DeadlineExceeded otherwise.
+    A timed-out call keeps running on the shared pool, but the request no longer waits for it.
+    """
+    if deadline is None:
+        return function(*args, **kwargs)
+
+    deadline.check(stage)
+    future = executor.submit(propagate(function), *args, **kwargs)
+    try:
+        return future.result(timeout=deadline.timeout(cap))
+    except TimeoutError:
+        print(f"Deadline: {stage} did not finish in time")
+        raise DeadlineExceeded(stage)
+
+def fit_max_tokens(deadline, max_tokens):
+    """
+    Shrinks 'max_tokens' to what Bedrock can generate before the deadline, keeping at least BEDROCK_MIN_TOKENS.
+    """
+    if deadline is None:
+        return max_tokens
+    generation_seconds = deadline.remaining() - first_token_ms / 1000
+    budget = int(generation_seconds * output_tokens_per_second)
+    fitted = max(min_answer_tokens, min(max_tokens, budget))
+    if fitted < max_tokens:
+        print(f"Deadline: max_tokens reduced from {max_tokens} to {fitted} ({deadline.remaining() * 1000:.0f} ms left)")
+    return fitted
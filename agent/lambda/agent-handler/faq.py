@@ -0,0 +1,52 @@
+import os
+import json
+import difflib
+import threading
+from cache import normalize_question
+from local_index import default_index_path
+
+# Curated FAQ answers returned directly when the utterance is (nearly) one of the FAQ questions, skipping Kendra and Bedrock
+faq_short_circuit = os.environ.get('FAQ_SHORT_CIRCUIT', 'true').lower() == 'true'
+faq_match_threshold = float(os.environ.get('FAQ_MATCH_THRESHOLD', '0.9'))
+
+_faq_index = None
+_lock = threading.Lock()
+
+def get_faq_index():
+    """
+    Returns the normalized question -> FAQ entry index, built once from the local index's documents.json.
+    """
+    global _faq_index
+    with _lock:
+        if _faq_index is None:
+            index_path = os.environ.get('LOCAL_INDEX_PATH') or default_index_path
+            with open(os.path.join(index_path, 'documents.json'), encoding='utf-8') as file:
+                documents = json.load(file)
+            _faq_index = {normalize_question(document['question']): document for document in documents}
+    return _faq_index
+
+def format_faq_answer(document):
+    """
+    Formats a curated answer with its source, the way Tools.invokeLLM cites sources.
+    """
+    return f"{document['answer']}\n\n[Source 1: {document['question']} - {document['source_uri']}]"
+
+def match_faq(question):
+    """
+    Returns the formatted curated answer for an exact or confident fuzzy FAQ match, or None.
+    """
+    if not faq_short_circuit:
+        return None
+
+    faq_index = get_faq_index()
+    normalized_question = normalize_question(question)
+
+    document = faq_index.get(normalized_question)
+    if document is None:
+        close_matches = difflib.get_close_matches(normalized_question, faq_index.keys(), n=1, cutoff=faq_match_threshold)
+        if not close_matches:
+            return None
+        document = faq_index[close_matches[0]]
+
+    print(f"FAQ short-circuit match: {document['question']}")
+    return format_faq_answer(document)
@@ -2,6 +2,9 @@ from langchain.agents.tools import Tool
 from langchain.agents.conversational.base import ConversationalAgent
 from langchain.agents import AgentExecutor
 from tools import Tools
+from faq import match_faq
+from deadline import DeadlineExceeded, TIMEOUT_MESSAGE
+from model_router import FAQ_ANSWER
 from datetime import datetime
 
 class FSIAgent:
@@ -39,10 +42,28 @@ class FSIAgent:
         
         return agent_executor
 
-    def run(self, input):
+    def set_memory(self, memory):
+        """
+        Swaps in the conversation memory for the current session, so one agent can be reused across warm invocations.
+        """
+        self.memory = memory
+        self.agent.memory = memory
+
+    def run(self, input, deadline=None, task=FAQ_ANSWER):
         print("Running FSI Agent with input: " + str(input))
+
+        # Near-verbatim FAQ questions are answered from the curated FAQ, without Kendra or Bedrock
+        faq_answer = match_faq(input)
+        if faq_answer is not None:
+            self.tools_instance.last_summary = None
+            return faq_answer
+
         try:
-            response = self.tools_instance.kendra_search(input)
+            response = self.tools_instance.kendra_search(input, deadline, task)
+        except DeadlineExceeded as e:
+            print(f"Error running agent: {e}")
+            self.tools_instance.last_summary = None
+            response = TIMEOUT_MESSAGE
         except ValueError as e:
             print(f"Error running agent: {e}")
             response = "Sorry! It appears we have encountered an issue."
@@ -1,30 +1,36 @@
+import coldstart # Must stay the first import so COLDSTART_PROFILE can measure every later import
 import os
 import json
 import time
-import boto3
-import pdfrw
-import difflib
+import uuid
 import logging
 import datetime
-import dateutil.parser
-
-from chat import Chat
-from fsi_agent import FSIAgent
-from boto3.dynamodb.conditions import Key
-from langchain.llms.bedrock import Bedrock
-from langchain.chains import ConversationChain
+from concurrent.futures import TimeoutError, wait
+from botocore.exceptions import BotoCoreError, ClientError
+
+from clients import get_dynamodb_resource, get_s3_client, get_bedrock_runtime
+from summarizer import summary_strategy, extractive_summary
+from accounts import get_user_accounts
+from session_facts import SessionFacts
+from pipeline import RequestPipeline
+from deadline import Deadline, DeadlineExceeded, remaining
+from model_router import AGENT, FAQ_ANSWER, SLOT_CLARIFICATION, SUMMARY, generate, route
+from slot_parser import parse_slot_value, stats as slot_stats
+from tracing import finish_trace, span, start_trace, traced
+
+# Heavy dependencies (langchain, pdfrw, dateutil) are imported lazily on the intent paths that need them,
+# so VerifyIdentity turns after a cold start only pay for boto3 and DynamoDB.
 
 # Create reference to DynamoDB tables and S3 bucket
 loan_application_table_name = os.environ['USER_PENDING_ACCOUNTS_TABLE']
-user_accounts_table_name = os.environ['USER_EXISTING_ACCOUNTS_TABLE']
 s3_artifact_bucket = os.environ['S3_ARTIFACT_BUCKET_NAME']
 
-# Instantiate boto3 clients and resources
-boto3_session = boto3.Session(region_name=os.environ['AWS_REGION'])
-dynamodb = boto3.resource('dynamodb',region_name=os.environ['AWS_REGION'])
-s3_client = boto3.client('s3',region_name=os.environ['AWS_REGION'],config=boto3.session.Config(signature_version='s3v4',))
-s3_object = boto3.resource('s3')
-bedrock_client = boto3_session.client(service_name="bedrock-runtime")
+# Warm-start singletons, constructed once per Lambda container and reused across invocations
+_llm = None
+_fsi_agent = None
+
+# The 'chain' summary is a second Bedrock call, only made when this much of the request deadline is left
+summary_chain_min_ms = float(os.environ.get('SUMMARY_CHAIN_MIN_MS', '3000'))
 
 # --- Lex v2 request/response helpers (https://docs.aws.amazon.com/lexv2/latest/dg/lambda-response-format.html) ---
 
@@ -148,6 +154,8 @@ def build_validation_result(isvalid, violated_slot, message_content):
 # --- Utility helper functions ---
 
 def isvalid_date(date):
+    import dateutil.parser
+
     try:
         dateutil.parser.parse(date, fuzzy=True)
         return True
@@ -155,16 +163,6 @@ def isvalid_date(date):
         print("Date parser error: " + str(e))
         return False
 
-def isvalid_yes_or_no(word):
-    reference_words = ['yes', 'no', 'yep', 'nope']
-    similarity_threshold = 0.7  # Adjust this threshold as needed
-
-    # Calculate similarity using difflib
-    similarity_scores = [difflib.SequenceMatcher(None, word.lower(), ref_word).ratio() for ref_word in reference_words]
-
-    # Check if the word is close to 'yes' or 'no' based on similarity threshold
-    return any(score >= similarity_threshold for score in similarity_scores)
-
 def isvalid_credit_score(credit_score):
     if int(credit_score) < 851 and int(credit_score) > 300:
         return True
@@ -185,7 +183,7 @@ def create_presigned_url(bucket_name, object_name, expiration=600):
     Generate a presigned URL for the S3 object.
     """
     try:
-        response = s3_client.generate_presigned_url('get_object',
+        response = get_s3_client().generate_presigned_url('get_object',
                                                     Params={'Bucket': bucket_name,
                                                             'Key': object_name},
                                                     ExpiresIn=expiration)
@@ -215,25 +213,14 @@ def try_ex(value):
 
 def isvalid_pin(userName, pin):
     """
-    Validates the user-provided PIN using a DynamoDB table lookup.
+    Validates the user-provided PIN against the user's account items (see accounts.get_user_accounts).
     """
-    plans_table = dynamodb.Table(user_accounts_table_name)
-
     try:
-        # Set up the query parameters
-        params = {
-            'KeyConditionExpression': 'userName = :c',
-            'ExpressionAttributeValues': {
-                ':c': userName
-            }
-        }
-
-        # Execute the query and get the result
-        response = plans_table.query(**params)
+        items = get_user_accounts(userName)
 
         # Iterate over the items returned in the response
-        if len(response['Items']) > 0:
-            pin_to_compare = int(response['Items'][0]['pin'])
+        if len(items) > 0:
+            pin_to_compare = int(items[0]['pin'])
             # Check if the password in the item matches the specified password
             if pin_to_compare == int(pin):
                 return True
@@ -241,35 +228,24 @@ def isvalid_pin(userName, pin):
         return False
 
     except Exception as e:
+        # A failed lookup must never count as a verified PIN
         print(e)
-        return e
+        return False
 
 def isvalid_username(userName):
     """
     Validates the user-provided username exists in the 'user_accounts_table_name' DynamoDB table.
+    Returns False when the lookup fails, so an unverified username is never accepted (or recorded as a session fact).
     """
-    plans_table = dynamodb.Table(user_accounts_table_name)
-
     try:
-        # Set up the query parameters
-        params = {
-            'KeyConditionExpression': 'userName = :c',
-            'ExpressionAttributeValues': {
-                ':c': userName
-            }
-        }
-
-        # Execute the query and get the result
-        response = plans_table.query(**params)
-
         # Check if any items were returned
-        if response['Count'] != 0:
+        if len(get_user_accounts(userName)) != 0:
             return True
         else:
             return False
     except Exception as e:
         print(e)
-        return e
+        return False
 
 def validate_pin(intent_request, slots):
     """
@@ -346,18 +322,11 @@ def verify_identity(intent_request):
         )
     else:
         if confirmation_status == 'None':
-            # Query DDB for user information before offering intents
-            plans_table = dynamodb.Table(user_accounts_table_name)
-
+            # Reuse the account items already loaded by validate_pin, rather than querying DDB again
             try:
-                # Query the table using the partition key
-                response = plans_table.query(
-                    KeyConditionExpression=Key('userName').eq(username)
-                )
-
                 # TODO: Customize account readout based on account type
                 message = ""
-                items = response['Items']
+                items = get_user_accounts(username)
                 for item in items:
                     if item['planName'] == 'mortgage' or item['planName'] == 'Mortgage':
                         message = "Your mortgage account summary includes a ${:,} loan at {}% interest with ${:,} of unpaid principal. Your next payment of ${:,} is scheduled for {}.".format(item['loanAmount'], item['loanInterest'], item['unpaidPrincipal'], item['amountDue'], item['dueDate'])
@@ -375,184 +344,155 @@ def verify_identity(intent_request):
                 print(e)
                 return e
 
-def validate_loan_application(intent_request, slots):
-    """
-    Elicits and validates slot values provided by the user. Invoked as part of 'loan_application' intent fulfillment.
+class SlotSpec:
+    """
+    Declares how validate_slots elicits, parses and validates one slot of a multi-turn form.
+    """
+
+    def __init__(self, name, prompt, slot_type='text', validator=None, invalid_message=None, clarify_prompt=None, session_default=None):
+        self.name = name
+        self.prompt = prompt                    # asked when the slot is empty
+        self.slot_type = slot_type              # 'number', 'yes_no' or 'text', see slot_parser.parse_slot_value
+        self.validator = validator              # called with the parsed value; must return a bool, only True passes
+        self.invalid_message = invalid_message  # formatted with the slot value when the validator rejects it
+        self.clarify_prompt = clarify_prompt    # tells the agent what was asked when the answer cannot be parsed
+        self.session_default = session_default  # session attribute that fills the slot when it is empty
+
+LOAN_APPLICATION_SLOTS = [
+    SlotSpec(
+        'UserName',
+        'We cannot find an account under that username. Please try again with a valid username.',
+        validator=isvalid_username,
+        invalid_message='Our records indicate there is no profile belonging to the username, {}. Please enter a valid username',
+        session_default='UserName'
+    ),
+    SlotSpec(
+        'LoanValue',
+        "What is your desired loan amount? In other words, how much are looking to borrow?",
+        slot_type='number',
+        validator=isvalid_zero_or_greater,
+        invalid_message='Please enter a value greater than $0.',
+        clarify_prompt='provide their loan value on a loan application'
+    ),
+    SlotSpec(
+        'MonthlyIncome',
+        "What is your monthly income?",
+        slot_type='number',
+        validator=isvalid_zero_or_greater,
+        invalid_message='Monthly income amount must be greater than $0. Please try again.',
+        clarify_prompt='provide their monthly income on a loan application'
+    ),
+    SlotSpec(
+        'WorkHistory',
+        "Do you have a two-year continuous work history?",
+        slot_type='yes_no',
+        clarify_prompt='confirm their continuous two year work history on a loan application'
+    ),
+    SlotSpec(
+        'CreditScore',
+        "What do you think your current credit score is?",
+        slot_type='number',
+        validator=isvalid_credit_score,
+        invalid_message='Credit score entries must be between 300 and 850. Please enter a valid credit score.',
+        clarify_prompt='provide their credit score on a loan application'
+    ),
+    SlotSpec(
+        'HousingExpense',
+        "How much are you currently paying for housing each month?",
+        slot_type='number',
+        validator=isvalid_zero_or_greater,
+        invalid_message='Your housing expense must be a value greater than or equal to $0. Please try again.',
+        clarify_prompt='provide their monthly housing expense on a loan application'
+    ),
+    SlotSpec(
+        'DebtAmount',
+        "What is your estimated credit card or student loan debt?",
+        slot_type='number',
+        validator=isvalid_zero_or_greater,
+        invalid_message='Your debt amount must be a value greater than or equal to $0. Please try again.',
+        clarify_prompt='provide their monthly debt amount on a loan application'
+    ),
+    SlotSpec(
+        'DownPayment',
+        "What do you have saved for a down payment?",
+        slot_type='number',
+        validator=isvalid_zero_or_greater,
+        invalid_message='Your estimate down payment must be a value greater than or equal to $0. Please try again.',
+        clarify_prompt='provide their estimated down payment on a loan application'
+    ),
+    SlotSpec(
+        'Coborrow',
+        "Do you have a co-borrower?",
+        slot_type='yes_no',
+        clarify_prompt='confirm if they will have a co-borrow on a loan application'
+    ),
+    SlotSpec(
+        'ClosingDate',
+        'When are you looking to close?'
+    )
+]
+
+def validate_slots(intent_request, slot_specs, deadline=None):
     """
-    username = try_ex(slots['UserName'])
-    loan_value = try_ex(slots['LoanValue'])
-    monthly_income = try_ex(slots['MonthlyIncome'])
-    work_history = try_ex(slots['WorkHistory'])
-    credit_score = try_ex(slots['CreditScore'])
-    housing_expense = try_ex(slots['HousingExpense'])
-    debt_amount = try_ex(slots['DebtAmount'])
-    down_payment = try_ex(slots['DownPayment'])
-    coborrow = try_ex(slots['Coborrow'])
-    closing_date = try_ex(slots['ClosingDate'])
+    Elicits and validates the slots declared by 'slot_specs', in order.
 
-    confirmation_status = intent_request['sessionState']['intent']['confirmationState']
+    Each validated answer is recorded as a signed session fact, so on later turns unchanged slots cost one lookup and
+    only the newly answered slot is parsed and validated. Formatted answers are normalized in place (e.g. '$450,000'
+    becomes 450000); the agent is only asked to help, within 'deadline', when an answer cannot be parsed.
+    """
+    slots = intent_request['sessionState']['intent']['slots']
     session_attributes = intent_request['sessionState'].get("sessionAttributes") or {}
+    # Validated facts are recorded here, so the dict must be the one returned to Lex
+    intent_request['sessionState']['sessionAttributes'] = session_attributes
     session_id = intent_request['sessionId']
-    active_contexts = {}
-
-    if username is not None:
-        if not isvalid_username(username):
-            return build_validation_result(
-                False,
-                'UserName',
-                'Our records indicate there is no profile belonging to the username, {}. Please enter a valid username'.format(username)
-            )
-    else:
-        try:
-            session_username = intent_request['sessionState']['sessionAttributes']['UserName']
-            build_slot(intent_request, 'UserName', session_username)
-        except KeyError:
-            return build_validation_result(
-                False,
-                'UserName',
-                'We cannot find an account under that username. Please try again with a valid username.'
-            )
+    facts = SessionFacts(session_attributes, session_id)
 
-    if loan_value is not None:
-        if loan_value.isnumeric():
-            if not isvalid_zero_or_greater(loan_value):
-                return build_validation_result(False, 'LoanValue', 'Please enter a value greater than $0.')
-        else:
-            prompt = "The user was just asked to provide their loan value on a loan application and this was their response: " + intent_request['inputTranscript']
-            message = invoke_agent(prompt, session_id)
-            reply = message + " \n\nWhat is your desired loan amount?"
-
-            return build_validation_result(False, 'LoanValue', reply)
-    else:
-        return build_validation_result(
-            False,
-            'LoanValue',
-            "What is your desired loan amount? In other words, how much are looking to borrow?"
-        )
-
-    if monthly_income is not None:
-        if monthly_income.isnumeric():
-            if not isvalid_zero_or_greater(monthly_income):
-                return build_validation_result(False, 'MonthlyIncome', 'Monthly income amount must be greater than $0. Please try again.')
-        else:
-            prompt = "The user was just asked to provide their monthly income on a loan application and this was their response: " + intent_request['inputTranscript']
-            message = invoke_agent(prompt, session_id)
-            reply = message + " \n\nWhat is your monthly income?"
-
-            return build_validation_result(False, 'MonthlyIncome', reply)
-    else:
-        return build_validation_result(
-            False,
-            'MonthlyIncome',
-            "What is your monthly income?"
-        )
-
-    if work_history is not None:
-        if not isvalid_yes_or_no(work_history):
-            prompt = "The user was just asked to confirm their continuous two year work history on a loan application and this was their response: " + intent_request['inputTranscript']
-            message = invoke_agent(prompt, session_id)
-            reply = message + " \n\nDo you have a two-year continuous work history?"
-
-            return build_validation_result(False, 'WorkHistory', reply)
-    else:
-        return build_validation_result(
-            False,
-            'WorkHistory',
-            "Do you have a two-year continuous work history?"
-        )
-
-    if credit_score is not None:
-        if credit_score.isnumeric():
-            if not isvalid_credit_score(credit_score):
-                return build_validation_result(False, 'CreditScore', 'Credit score entries must be between 300 and 850. Please enter a valid credit score.')
-        else:
-            prompt = "The user was just asked to provide their credit score on a loan application and this was their response: " + intent_request['inputTranscript']
-            message = invoke_agent(prompt, session_id)
-            reply = message + " \n\nWhat do you think your current credit score is?"
-
-            return build_validation_result(False, 'CreditScore', reply)
-    else:
-        return build_validation_result(
-            False,
-            'CreditScore',
-            "What do you think your current credit score is?"
-        )
-
-    if housing_expense is not None:
-        if housing_expense.isnumeric():
-            if not isvalid_zero_or_greater(housing_expense):
-                return build_validation_result(False, 'HousingExpense', 'Your housing expense must be a value greater than or equal to $0. Please try again.')
-        else:
-            prompt = "The user was just asked to provide their monthly housing expense on a loan application and this was their response: " + intent_request['inputTranscript']
-            message = invoke_agent(prompt, session_id)
-            reply = message + " \n\nHow much are you currently paying for housing each month?"
-
-            return build_validation_result(False, 'HousingExpense', reply)
-    else:
-        return build_validation_result(
-            False,
-            'HousingExpense',
-            "How much are you currently paying for housing each month?"
-        )
-
-    if debt_amount is not None:
-        if debt_amount.isnumeric():
-            if not isvalid_zero_or_greater(debt_amount):
-                return build_validation_result(False, 'DebtAmount', 'Your debt amount must be a value greater than or equal to $0. Please try again.')
-        else:
-            prompt = "The user was just asked to provide their monthly debt amount on a loan application and this was their response: " + intent_request['inputTranscript']
-            message = invoke_agent(prompt, session_id)
-            reply = message + " \n\nWhat is your estimated credit card or student loan debt?"
-
-            return build_validation_result(False, 'DebtAmount', reply)
-    else:
-        return build_validation_result(
-            False,
-            'DebtAmount',
-            "What is your estimated credit card or student loan debt?"
-        )
-
-    if down_payment is not None:
-        if down_payment.isnumeric():
-            if not isvalid_zero_or_greater(down_payment):
-                return build_validation_result(False, 'DownPayment', 'Your estimate down payment must be a value greater than or equal to $0. Please try again.')
-        else:
-            prompt = "The user was just asked to provide their estimated down payment on a loan application and this was their response: " + intent_request['inputTranscript']
-            message = invoke_agent(prompt, session_id)
-            reply = message + " \n\nWhat do you have saved for a down payment?"
-
-            return build_validation_result(False, 'DownPayment', reply)
-    else:
-        return build_validation_result(
-            False,
-            'DownPayment',
-            "What do you have saved for a down payment?"
-        )
-
-    if coborrow is not None:
-        if not isvalid_yes_or_no(coborrow):
-            prompt = "The user was just asked to confirm if they will have a co-borrow on a loan application and this was their response: " + intent_request['inputTranscript']
-            message = invoke_agent(prompt, session_id)
-            reply = message + " \n\nDo you have a co-borrower?"
-
-            return build_validation_result(False, 'Coborrow', reply)
-    else:
-        return build_validation_result(
-            False,
-            'Coborrow',
-            "Do you have a co-borrower?"
-        )
-
-    if closing_date is None:
-        return build_validation_result(
-            False,
-            'ClosingDate',
-            'When are you looking to close?'
-        )
-
-    return {'isValid': True}
+    try:
+        for spec in slot_specs:
+            value = try_ex(slots.get(spec.name))
+
+            if value is None:
+                if spec.session_default in session_attributes:
+                    build_slot(intent_request, spec.name, session_attributes[spec.session_default])
+                    continue
+                return build_validation_result(False, spec.name, spec.prompt)
+
+            if facts.get(spec.name, value) is not None:
+                continue
+
+            parsed = parse_slot_value(spec.slot_type, value)
+            if parsed is None:
+                slot_stats.record(spec.name, 'llm_fallback')
+                print(f"Slot {spec.name} needs LLM fallback; slot parse stats: {slot_stats.summary()}")
+                prompt = "The user was just asked to " + spec.clarify_prompt + " and this was their response: " + intent_request['inputTranscript']
+                message = invoke_agent(prompt, session_id, deadline, SLOT_CLARIFICATION)
+                reply = message + " \n\n" + spec.prompt
+
+                return build_validation_result(False, spec.name, reply)
+
+            normalized_value, parsed_value = parsed
+            if normalized_value != value:
+                build_slot(intent_request, spec.name, normalized_value)
+                slot_stats.record(spec.name, 'normalized')
+            else:
+                slot_stats.record(spec.name, 'plain')
+
+            # Only an explicit True is a pass, so a validator that returns anything else can never produce a signed fact
+            if spec.validator is not None and spec.validator(parsed_value) is not True:
+                return build_validation_result(False, spec.name, spec.invalid_message.format(value))
+            facts.record(spec.name, normalized_value, parsed_value)
+
+        return {'isValid': True}
+    finally:
+        facts.save()
+
+def validate_loan_application(intent_request, slots, deadline=None):
+    """
+    Elicits and validates slot values provided by the user. Invoked as part of 'loan_application' intent fulfillment.
+    """
+    return validate_slots(intent_request, LOAN_APPLICATION_SLOTS, deadline)
 
-def loan_application(intent_request):
+def loan_application(intent_request, deadline=None):
     """
     Performs dialog management and fulfillment for completing a mortgage loan application.
 
@@ -562,26 +502,17 @@ def loan_application(intent_request):
     """
     slots = intent_request['sessionState']['intent']['slots']
 
-    username = try_ex(slots['UserName'])
-    loan_value = try_ex(slots['LoanValue'])
-    monthly_income = try_ex(slots['MonthlyIncome'])
-    work_history = try_ex(slots['WorkHistory'])
-    credit_score = try_ex(slots['CreditScore'])
-    housing_expense = try_ex(slots['HousingExpense'])
-    debt_amount = try_ex(slots['DebtAmount'])
-    down_payment = try_ex(slots['DownPayment'])
-    coborrow = try_ex(slots['Coborrow'])
-    closing_date = try_ex(slots['ClosingDate'])
-
     confirmation_status = intent_request['sessionState']['intent']['confirmationState']
     session_attributes = intent_request['sessionState'].get("sessionAttributes") or {}
+    # Validated facts are recorded here, so the dict must be the one returned to Lex
+    intent_request['sessionState']['sessionAttributes'] = session_attributes
     intent = intent_request['sessionState']['intent']
     active_contexts = {}
     
     if intent_request['invocationSource'] == 'DialogCodeHook':
 
         # Validate any slots which have been specified. If any are invalid, re-elicit for their value
-        validation_result = validate_loan_application(intent_request, intent_request['sessionState']['intent']['slots'])
+        validation_result = validate_loan_application(intent_request, intent_request['sessionState']['intent']['slots'], deadline)
 
         if 'isValid' in validation_result:
             if validation_result['isValid'] == False:   
@@ -600,6 +531,13 @@ def loan_application(intent_request):
                     validation_result['message']
                 )  
 
+    # Read after validation, which rewrites formatted answers (e.g. '$450,000') as plain values
+    username = try_ex(slots['UserName'])
+    loan_value = try_ex(slots['LoanValue'])
+    monthly_income = try_ex(slots['MonthlyIncome'])
+    credit_score = try_ex(slots['CreditScore'])
+    down_payment = try_ex(slots['DownPayment'])
+
     if username and monthly_income:
         application = {
             'LoanValue': loan_value,
@@ -612,28 +550,23 @@ def loan_application(intent_request):
         application_string = json.dumps(application)
 
         # Write the JSON document to DynamoDB
-        loan_application_table = dynamodb.Table(loan_application_table_name)
-
-        response = loan_application_table.put_item(
-            Item={
-                'userName': username,
-                'planName': 'Loan',
-                'document': application_string
-            }
-        )
+        loan_application_table = get_dynamodb_resource().Table(loan_application_table_name)
+        application_item = {
+            'userName': username,
+            'planName': 'Loan',
+            'document': application_string
+        }
 
         # Determine if the intent and current slot settings have been denied
         if confirmation_status == 'Denied' or confirmation_status == 'None':
+            loan_application_table.put_item(Item=application_item)
             return delegate(session_attributes, active_contexts, intent, 'How else can I help you?')
 
         if confirmation_status == 'Confirmed':
             intent['confirmationState']="Confirmed"
             intent['state']="Fulfilled"
 
-        s3_client.download_file(s3_artifact_bucket, 'agent/assets/Mortgage-Loan-Application.pdf', '/tmp/Mortgage-Loan-Application.pdf')
-
-        reader = pdfrw.PdfReader('/tmp/Mortgage-Loan-Application.pdf')
-        acroform = reader.Root.AcroForm
+        from mortgage_pdf import application_object_key, upload_application
 
         fields_to_update = {
             'name': username,
@@ -643,32 +576,35 @@ def loan_application(intent_request):
             'downPayment12': down_payment
         }
 
-        # Get the fields from the PDF
-        fields = reader.Root.AcroForm.Fields
-
-        # Loop through the fields
-        for field in fields:
-            field_name = field.T if hasattr(field, 'T') else ''
-            field_value = field.V if hasattr(field, 'V') else ''
-
-        if acroform is not None and '/Fields' in acroform:
-            fields = acroform['/Fields']
-            for field in fields:
-                field_name = field['/T'][1:-1]  # Extract field name without '/'
-                if field_name in fields_to_update:
-                    field.update(pdfrw.PdfDict(V=fields_to_update[field_name]))
-
-        writer = pdfrw.PdfWriter()
-        writer.addpage(reader.pages[0])  # Assuming you are updating the first page
-
-        with open('/tmp/Mortgage-Loan-Application-Completed.pdf', 'wb') as output_stream:
-            writer.write(output_stream)
-            
-        s3_client.upload_file('/tmp/Mortgage-Loan-Application-Completed.pdf', s3_artifact_bucket, 'agent/assets/Mortgage-Loan-Application-Completed.pdf')
+        # Each application gets its own S3 object, so concurrent users never receive each other's documents
+        application_id = uuid.uuid4().hex
+        application_key = application_object_key(username, intent_request['sessionId'], application_id)
+        application_item['applicationId'] = application_id
+        application_item['documentKey'] = application_key
+
+        # The DynamoDB write, the PDF upload and the presigned URL are independent, so they run concurrently
+        pipeline = RequestPipeline('loan_application')
+        put_future = pipeline.submit('application_put_item', loan_application_table.put_item, Item=application_item)
+        upload_future = pipeline.submit('application_upload', upload_application, s3_artifact_bucket, application_key, fields_to_update)
+        url_future = pipeline.submit('application_presign', create_presigned_url, s3_artifact_bucket, application_key, 3600)
+
+        # The uploads keep running if the deadline passes, but the user gets an answer instead of a Lambda timeout
+        _, pending = wait([put_future, upload_future, url_future], timeout=remaining(deadline))
+        if pending:
+            print(f"Deadline: loan application for {username} not submitted in time")
+            pipeline.report()
+            return elicit_intent(
+                intent_request,
+                session_attributes,
+                'Sorry, submitting your loan application is taking longer than expected. Please try again in a moment.'
+            )
+        put_future.result()
+        upload_future.result()
 
         # Create loan application doc in S3
         URLs=[]
-        URLs.append(create_presigned_url(s3_artifact_bucket,'agent/assets/Mortgage-Loan-Application-Completed.pdf',3600))
+        URLs.append(url_future.result())
+        pipeline.report()
         mortgage_app = 'Your loan application is nearly complete! Please follow the link for the last few bits of information: ' + URLs[0]
 
         print("Loan Application Submitted Successfully")
@@ -681,38 +617,133 @@ def loan_application(intent_request):
 
 def loan_calculator(intent_request):
     """
-    Performs dialog management and fulfillment for calculating loan details.
-    This is an empty function framework intended for the user to develope their own intent fulfillment functions.
+    Performs fulfillment for the mortgage calculator: payment, extra-payment and refinance what-ifs and a rate x term grid.
+    Loan figures mentioned in the utterance (e.g. '$400k at 6.5% for 30 years') take precedence over the verified
+    user's mortgage account (loanAmount, loanInterest, loanDuration).
     """
+    from amortization import describe_loan, parse_calculator_request, validate_loan
+
     session_attributes = intent_request['sessionState'].get("sessionAttributes") or {}
+    loan = parse_calculator_request(intent_request.get('inputTranscript'))
+
+    account = {}
+    username = session_attributes.get('UserName')
+    if username:
+        try:
+            items = get_user_accounts(username)
+            account = next((item for item in items if 'loanAmount' in item), {})
+        except Exception as e:
+            print(e)
+
+    # A stated 0% rate is a real rate, so only missing values fall back to the account
+    principal = loan['loanAmount'] if loan['loanAmount'] is not None else account.get('loanAmount')
+    annual_rate = loan['loanInterest'] if loan['loanInterest'] is not None else account.get('loanInterest')
+    years = loan['loanDuration'] if loan['loanDuration'] is not None else account.get('loanDuration')
+
+    if principal is None or annual_rate is None or years is None:
+        return elicit_intent(
+            intent_request,
+            session_attributes,
+            "Tell me the loan amount, interest rate and term, for example: '$400,000 at 6.5% for 30 years'. "
+            "If you verify your identity first, I can use your current mortgage."
+        )
+
+    invalid_message = validate_loan(float(principal), float(annual_rate), float(years), loan['extraPayment'], loan['refinanceRate'])
+    if invalid_message is not None:
+        return elicit_intent(
+            intent_request,
+            session_attributes,
+            invalid_message + " Tell me the loan amount, interest rate and term, for example: '$400,000 at 6.5% for 30 years'."
+        )
 
-    # def elicit_intent(intent_request, session_attributes, message)
-    return elicit_intent(
-        intent_request,
-        session_attributes,
-        'This is where you would implement LoanCalculator intent fulfillment.'
+    # Only the account's own loan has a known unpaid principal to refinance
+    unpaid_principal = account.get('unpaidPrincipal') if loan['loanAmount'] is None else None
+    message = describe_loan(
+        float(principal),
+        float(annual_rate),
+        int(years),
+        extra_payment=loan['extraPayment'],
+        refinance_rate=loan['refinanceRate'],
+        unpaid_principal=float(unpaid_principal) if unpaid_principal else None
     )
 
-def invoke_agent(prompt, session_id):
+    return elicit_intent(intent_request, session_attributes, message)
+
+def invoke_agent(prompt, session_id, deadline=None, task=FAQ_ANSWER):
     """
-    Invokes Amazon Bedrock-powered LangChain agent with 'prompt' input.
+    Invokes Amazon Bedrock-powered LangChain agent with 'prompt' input, answering within 'deadline' if given with the
+    model routed for 'task'.
     """
-    chat = Chat({'Human': prompt}, session_id)
-    llm = Bedrock(client=bedrock_client, model_id="anthropic.claude-v2:1", region_name=os.environ['AWS_REGION']) # anthropic.claude-instant-v1 / anthropic.claude-3-sonnet-20240229-v1:0
-    llm.model_kwargs = {'max_tokens_to_sample': 350}
-    lex_agent = FSIAgent(llm, chat.memory)
-    
-    message = lex_agent.run(input=prompt)
+    from chat import Chat
 
-    # summarize response and save in memory
-    formatted_prompt = "\n\nHuman: " + "Summarize the following within 50 words: " + message + " \n\nAssistant:"
-    conversation = ConversationChain(llm=llm)
-    ai_response_recap = conversation.predict(input=formatted_prompt)
-    chat.set_memory({'Assistant': ai_response_recap}, session_id)
+    pipeline = RequestPipeline('invoke_agent')
+
+    # The DynamoDB chat index and history writes do not depend on the answer, so they overlap retrieval and generation
+    chat_future = pipeline.submit('chat_setup', Chat, {'Human': prompt}, session_id)
+    lex_agent = pipeline.run('agent_setup', get_agent)
+
+    message = pipeline.run('agent_run', lex_agent.run, input=prompt, deadline=deadline, task=task)
 
+    # summarize response and save in memory
+    ai_response_recap = pipeline.run('summarize', summarize_response, message, lex_agent.tools_instance.last_summary, deadline)
+    try:
+        chat = chat_future.result(timeout=remaining(deadline))
+    except TimeoutError:
+        print("Deadline: chat history not ready, the answer is not saved to memory")
+        pipeline.report()
+        return message
+    lex_agent.set_memory(chat.memory)
+    pipeline.run('chat_save', chat.set_memory, {'Assistant': ai_response_recap}, session_id)
+
+    pipeline.report()
     return message
 
-def genai_intent(intent_request):
+def get_llm():
+    """
+    Returns the container-wide LangChain Bedrock LLM, with the model and token budget of the 'agent' route.
+    """
+    global _llm
+    if _llm is None:
+        from langchain.llms.bedrock import Bedrock
+
+        agent_route = route(AGENT)
+        _llm = Bedrock(client=get_bedrock_runtime(), model_id=agent_route.model, region_name=os.environ['AWS_REGION'])
+        _llm.model_kwargs = {'max_tokens_to_sample': agent_route.max_tokens, 'temperature': agent_route.temperature}
+    return _llm
+
+def get_agent(memory=None):
+    """
+    Returns the container-wide FSIAgent, with the current session's conversation memory injected if given.
+    """
+    global _fsi_agent
+    if _fsi_agent is None:
+        from fsi_agent import FSIAgent
+
+        _fsi_agent = FSIAgent(get_llm(), memory)
+    elif memory is not None:
+        _fsi_agent.set_memory(memory)
+    return _fsi_agent
+
+def summarize_response(message, inline_summary, deadline=None):
+    """
+    Produces the conversation memory recap of 'message' using the configured SUMMARY_STRATEGY.
+    Only the 'chain' strategy makes a second LLM call, on the 'summary' route; 'inline' falls back to an extractive
+    summary when the answer had none.
+    The chain falls back to the extractive summary when less than SUMMARY_CHAIN_MIN_MS of the 'deadline' is left or
+    the call fails, so the answer already in hand is never lost to its summary.
+    """
+    if summary_strategy == 'chain' and (deadline is None or deadline.remaining() * 1000 >= summary_chain_min_ms):
+        try:
+            return generate(SUMMARY, "Summarize the following within 50 words: " + message, deadline=deadline)
+        except (DeadlineExceeded, BotoCoreError, ClientError) as e:
+            print(f"Summary call failed, using an extractive summary: {e}")
+
+    if summary_strategy == 'inline' and inline_summary:
+        return inline_summary
+
+    return extractive_summary(message)
+
+def genai_intent(intent_request, deadline=None):
     """
     Performs dialog management and fulfillment for user utterances that do not match defined intents (e.g., FallbackIntent).
     Sends user utterance to the 'invoke_agent' method call.
@@ -722,16 +753,17 @@ def genai_intent(intent_request):
     
     if intent_request['invocationSource'] == 'DialogCodeHook':
         prompt = intent_request['inputTranscript']
-        output = invoke_agent(prompt, session_id)
+        output = invoke_agent(prompt, session_id, deadline)
         print("FSI Agent response: " + str(output))
 
     return elicit_intent(intent_request, session_attributes, output)
 
 # --- Intents ---
 
-def dispatch(intent_request):
+@traced('dispatch')
+def dispatch(intent_request, deadline=None):
     """
-    Routes the incoming request based on intent.
+    Routes the incoming request based on intent. Intents that call Bedrock, Kendra or S3 receive the request 'deadline'.
     """
     slots = intent_request['sessionState']['intent']['slots']
     username = slots['UserName'] if 'UserName' in slots else None
@@ -740,11 +772,11 @@ def dispatch(intent_request):
     if intent_name == 'VerifyIdentity':
         return verify_identity(intent_request)
     elif intent_name == 'LoanApplication':
-        return loan_application(intent_request)
+        return loan_application(intent_request, deadline)
     elif intent_name == 'LoanCalculator':
         return loan_calculator(intent_request)
     else:
-        return genai_intent(intent_request)
+        return genai_intent(intent_request, deadline)
 
     raise Exception('Intent with name ' + intent_name + ' not supported')
         
@@ -757,5 +789,14 @@ def handler(event, context):
     """
     os.environ['TZ'] = 'America/New_York'
     time.tzset()
+    coldstart.mark_init_complete()
+    # Taken first, so everything after counts against the invocation's remaining time
+    deadline = Deadline.from_context(context)
+    trace = start_trace(event['sessionState']['intent']['name'])
 
-    return dispatch(event)
\ No newline at end of file
+    try:
+        with span('handler', Source=event.get('invocationSource')):
+            return dispatch(event, deadline)
+    finally:
+        finish_trace(trace)
+        coldstart.report()
\ No newline at end of file
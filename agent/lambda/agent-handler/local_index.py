@@ -0,0 +1,148 @@
+import os
+import re
+import csv
+import sys
+import json
+import math
+import threading
+from collections import Counter
+
+# Offline BM25 retrieval over the AnyCompany FAQ CSV, as a Kendra alternative for dev, load tests and cost-sensitive tenants.
+# The index is built ahead of time (see __main__) into NumPy arrays that are memory-mapped at runtime:
+#   term_offsets.npy  postings for term t are doc_ids[term_offsets[t]:term_offsets[t + 1]]
+#   doc_ids.npy       document ids of each posting
+#   weights.npy       precomputed BM25 weight of each posting, so a query is a handful of vector additions
+#   vocabulary.json   term -> term id
+#   documents.json    question, answer and source URI of each FAQ entry
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'does', 'for', 'from', 'how', 'i', 'if', 'in', 'is',
+              'it', 'me', 'my', 'of', 'on', 'or', 'our', 'that', 'the', 'this', 'to', 'we', 'what', 'when', 'where', 'which',
+              'who', 'why', 'will', 'with', 'you', 'your'}
+
+default_index_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'faq_index')
+
+_index = None
+_lock = threading.Lock()
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+def read_faqs(csv_path):
+    """
+    Reads the Kendra FAQ CSV (_question, _answer, _source_uri), removing the quotes that wrap each answer.
+    """
+    with open(csv_path, newline='', encoding='utf-8') as file:
+        return [
+            {'question': row['_question'].strip(), 'answer': row['_answer'].strip().strip('"'), 'source_uri': row['_source_uri'].strip()}
+            for row in csv.DictReader(file) if row.get('_question')
+        ]
+
+def build_index(csv_path, index_path, k1=1.2, b=0.75):
+    """
+    Builds the BM25 index from the FAQ CSV and serializes it to 'index_path'.
+    Question terms are counted twice, since a matching question is the strongest relevance signal.
+    """
+    import numpy as np
+
+    documents = read_faqs(csv_path)
+    term_frequencies = [Counter(tokenize(doc['question']) * 2 + tokenize(doc['answer'])) for doc in documents]
+    lengths = [sum(frequencies.values()) for frequencies in term_frequencies]
+    average_length = sum(lengths) / len(lengths)
+
+    postings = {}
+    for doc_id, frequencies in enumerate(term_frequencies):
+        for term, frequency in frequencies.items():
+            postings.setdefault(term, []).append((doc_id, frequency))
+
+    vocabulary = {}
+    term_offsets, doc_ids, weights = [0], [], []
+    for term_id, term in enumerate(sorted(postings)):
+        vocabulary[term] = term_id
+        term_postings = postings[term]
+        idf = math.log(1 + (len(documents) - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+        for doc_id, frequency in term_postings:
+            doc_ids.append(doc_id)
+            weights.append(idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * lengths[doc_id] / average_length)))
+        term_offsets.append(len(doc_ids))
+
+    os.makedirs(index_path, exist_ok=True)
+    np.save(os.path.join(index_path, 'term_offsets.npy'), np.array(term_offsets, dtype=np.int32))
+    np.save(os.path.join(index_path, 'doc_ids.npy'), np.array(doc_ids, dtype=np.int32))
+    np.save(os.path.join(index_path, 'weights.npy'), np.array(weights, dtype=np.float32))
+    with open(os.path.join(index_path, 'vocabulary.json'), 'w', encoding='utf-8') as file:
+        json.dump(vocabulary, file, separators=(',', ':'))
+    with open(os.path.join(index_path, 'documents.json'), 'w', encoding='utf-8') as file:
+        json.dump(documents, file, indent=1)
+
+    print(f"Built local index with {len(documents)} documents and {len(vocabulary)} terms in {index_path}")
+
+class LocalIndex:
+    """
+    Memory-mapped BM25 index returning results in the shape of a Kendra Query response.
+    """
+
+    def __init__(self, index_path):
+        import numpy as np
+
+        self.np = np
+        self.term_offsets = np.load(os.path.join(index_path, 'term_offsets.npy'), mmap_mode='r')
+        self.doc_ids = np.load(os.path.join(index_path, 'doc_ids.npy'), mmap_mode='r')
+        self.weights = np.load(os.path.join(index_path, 'weights.npy'), mmap_mode='r')
+        with open(os.path.join(index_path, 'vocabulary.json'), encoding='utf-8') as file:
+            self.vocabulary = json.load(file)
+        with open(os.path.join(index_path, 'documents.json'), encoding='utf-8') as file:
+            self.documents = json.load(file)
+
+    def search(self, question, page_size=5):
+        scores = self.np.zeros(len(self.documents), dtype=self.np.float32)
+        for term in set(tokenize(question)):
+            term_id = self.vocabulary.get(term)
+            if term_id is not None:
+                start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+                # A term has at most one posting per document, so fancy-index addition is safe
+                scores[self.doc_ids[start:end]] += self.weights[start:end]
+
+        ranked = self.np.argsort(-scores, kind='stable')[:page_size]
+        top_score = float(scores[ranked[0]]) if len(ranked) else 0.0
+
+        result_items = []
+        for doc_id in ranked:
+            score = float(scores[doc_id])
+            if score <= 0:
+                break
+            result_items.append(self.result_item(int(doc_id), score / top_score))
+
+        return {'ResultItems': result_items, 'TotalNumberOfResults': len(result_items)}
+
+    def result_item(self, doc_id, relative_score):
+        document = self.documents[doc_id]
+        confidence = 'VERY_HIGH' if relative_score > 0.9 else 'HIGH' if relative_score > 0.6 else 'MEDIUM' if relative_score > 0.3 else 'LOW'
+        return {
+            'Id': f"faq-{doc_id}",
+            'Type': 'QUESTION_ANSWER',
+            'DocumentTitle': {'Text': document['question']},
+            'DocumentExcerpt': {'Text': document['answer']},
+            'AdditionalAttributes': [{
+                'Key': 'AnswerText',
+                'ValueType': 'TEXT_WITH_HIGHLIGHTS_VALUE',
+                'Value': {'TextWithHighlightsValue': {'Text': document['answer'], 'Highlights': []}}
+            }],
+            'DocumentURI': document['source_uri'],
+            'DocumentAttributes': [{'Key': '_source_uri', 'Value': {'StringValue': document['source_uri']}}],
+            'ScoreAttributes': {'ScoreConfidence': confidence}
+        }
+
+def get_local_index(index_path=None):
+    """
+    Returns the container-wide local index, loading it on first use.
+    """
+    global _index
+    with _lock:
+        if _index is None:
+            _index = LocalIndex(index_path or os.environ.get('LOCAL_INDEX_PATH') or default_index_path)
+    return _index
+
+if __name__ == '__main__':
+    # python local_index.py ../../assets/AnyCompany-FAQs.csv [faq_index]
+    build_index(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else default_index_path)
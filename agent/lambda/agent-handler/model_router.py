@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import threading
+import bedrock
+from deadline import fit_max_tokens
+from tracing import annotate, span
+
+# Task-aware model routing. Each generation task is served by the model and token budget of its route, so short
+# tasks (one-line slot re-asks, 50-word summaries) use a fast, cheap model while FAQ answers keep the primary model.
+# MODEL_ROUTES (JSON) overrides any route field, e.g. {"summary": {"model": "anthropic.claude-3-haiku-20240307-v1:0", "max_tokens": 120}}
+FAQ_ANSWER = 'faq_answer'
+SLOT_CLARIFICATION = 'slot_clarification'
+SUMMARY = 'summary'
+# The LangChain agent LLM (see lambda_function.get_llm); it must be a text completion model such as Claude 2
+AGENT = 'agent'
+
+fast_model_id = os.environ.get('BEDROCK_FAST_MODEL', 'anthropic.claude-3-haiku-20240307-v1:0')
+
+DEFAULT_ROUTES = {
+    FAQ_ANSWER: {'model': bedrock.primary_model_id, 'max_tokens': int(os.environ.get('BEDROCK_MAX_TOKENS', '4096')), 'temperature': 0.5},
+    SLOT_CLARIFICATION: {'model': fast_model_id, 'max_tokens': 300, 'temperature': 0.5},
+    SUMMARY: {'model': fast_model_id, 'max_tokens': 150, 'temperature': 0.2},
+    AGENT: {'model': 'anthropic.claude-v2:1', 'max_tokens': 350, 'temperature': 0.5}
+}
+
+# On-demand USD price per 1,000 input and output tokens, for the per-route cost metric
+MODEL_PRICES = {
+    'anthropic.claude-3-sonnet-20240229-v1:0': (0.003, 0.015),
+    'anthropic.claude-3-haiku-20240307-v1:0': (0.00025, 0.00125),
+    'anthropic.claude-v2:1': (0.008, 0.024),
+    'anthropic.claude-instant-v1': (0.0008, 0.0024)
+}
+
+class Route:
+
+    def __init__(self, task, model, max_tokens, temperature=0.5):
+        self.task = task
+        self.model = model
+        self.max_tokens = int(max_tokens)
+        self.temperature = float(temperature)
+
+def load_routes(overrides=None):
+    """
+    Returns the routes by task: DEFAULT_ROUTES updated with 'overrides' (default: the MODEL_ROUTES JSON).
+    """
+    if overrides is None:
+        overrides = json.loads(os.environ.get('MODEL_ROUTES') or '{}')
+    routes = {}
+    for task in set(DEFAULT_ROUTES) | set(overrides):
+        config = dict(DEFAULT_ROUTES.get(task, DEFAULT_ROUTES[FAQ_ANSWER]))
+        config.update(overrides.get(task, {}))
+        routes[task] = Route(task, **config)
+    return routes
+
+routes = load_routes()
+
+def route(task):
+    return routes.get(task) or routes[FAQ_ANSWER]
+
+def token_cost(model_id, input_tokens, output_tokens):
+    """
+    Returns the USD cost of a call, or 0 for models missing from MODEL_PRICES.
+    """
+    input_price, output_price = MODEL_PRICES.get(model_id, (0, 0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1000
+
+class RouteStats:
+    """
+    Calls, errors, latency, tokens and cost of one route, kept for the lifetime of the container.
+    Tokens and cost include the losing attempts of hedged calls, which are counted in 'hedged_attempts'.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.hedged_attempts = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.latency = bedrock.LatencyHistogram()
+        self.lock = threading.Lock()
+
+    def record(self, latency_ms, usage=None):
+        self.latency.record(latency_ms)
+        with self.lock:
+            self.calls += 1
+            if usage is None:
+                self.errors += 1
+                return
+            self.hedged_attempts += len(usage.get('hedged', []))
+            for attempt in [usage] + usage.get('hedged', []):
+                self.input_tokens += attempt.get('input_tokens', 0)
+                self.output_tokens += attempt.get('output_tokens', 0)
+            self.cost += usage['cost']
+
+    def summary(self):
+        latency = self.latency.summary()
+        with self.lock:
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'hedged_attempts': self.hedged_attempts,
+                'p50_ms': latency['p50_ms'],
+                'p95_ms': latency['p95_ms'],
+                'input_tokens': self.input_tokens,
+                'output_tokens': self.output_tokens,
+                'cost_usd': round(self.cost, 6)
+            }
+
+route_stats = {}
+_stats_lock = threading.Lock()
+
+def stats(task):
+    with _stats_lock:
+        return route_stats.setdefault(task, RouteStats())
+
+def stats_summary():
+    with _stats_lock:
+        current = dict(route_stats)
+    return {task: task_stats.summary() for task, task_stats in sorted(current.items())}
+
+def generate(task, prompt, stream=False, max_chars=0, deadline=None, usage=None):
+    """
+    Answers 'prompt' with the model and token budget routed for 'task' (max_tokens also fitted to the 'deadline'),
+    recording the route's latency, tokens and cost.
+    A 'usage' dict receives the call's usage, including 'cut_short' and the losing 'hedged' attempts (see
+    bedrock.invoke), and its 'cost', which covers the losing attempts too.
+    """
+    selected = route(task)
+    request_body = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": fit_max_tokens(deadline, selected.max_tokens),
+        "temperature": selected.temperature,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt
+                    }
+                ]
+            }
+        ]
+    }
+
+    usage = {} if usage is None else usage
+    start_time = time.perf_counter()
+    with span(f"route.{task}", Route=task, Model=selected.model):
+        try:
+            answer = bedrock.invoke(request_body, model_id=selected.model, stream=stream, max_chars=max_chars, deadline=deadline, usage=usage)
+        except Exception:
+            stats(task).record((time.perf_counter() - start_time) * 1000)
+            raise
+        # Hedged requests may be answered by another model, and the losing attempt is billed as well
+        usage['cost'] = token_cost(usage.get('model', selected.model), usage.get('input_tokens', 0), usage.get('output_tokens', 0))
+        usage['cost'] += sum(token_cost(attempt['model'], attempt['input_tokens'], attempt['output_tokens']) for attempt in usage.get('hedged', []))
+        annotate(Cost=usage['cost'])
+
+    stats(task).record((time.perf_counter() - start_time) * 1000, usage)
+    print(f"Model route {task}: {usage.get('model', selected.model)}, {usage.get('input_tokens', 0)} in / {usage.get('output_tokens', 0)} out tokens, {len(usage.get('hedged', []))} hedged attempts, ${usage['cost']:.5f}; route stats: {stats_summary()}")
+    return answer
@@ -0,0 +1,86 @@
+import io
+import re
+import pdfrw
+import threading
+from boto3.s3.transfer import TransferConfig
+from clients import get_s3_client
+from tracing import annotate, traced
+
+template_key = 'agent/assets/Mortgage-Loan-Application.pdf'
+completed_file_name = 'Mortgage-Loan-Application-Completed.pdf'
+
+# Multipart upload straight from the in-memory buffer once the document exceeds the threshold
+transfer_config = TransferConfig(multipart_threshold=5 * 1024 * 1024, multipart_chunksize=5 * 1024 * 1024, max_concurrency=4)
+
+# Parsed template and AcroForm field index, kept in memory across warm invocations
+_template = None
+_field_index = None
+_lock = threading.Lock()
+
+def load_template(bucket_name):
+    """
+    Downloads and parses the mortgage application template once per Lambda container.
+    """
+    global _template, _field_index
+
+    with _lock:
+        if _template is None:
+            template_bytes = get_s3_client().get_object(Bucket=bucket_name, Key=template_key)['Body'].read()
+            reader = pdfrw.PdfReader(fdata=template_bytes)
+
+            field_index = {}
+            acroform = reader.Root.AcroForm
+            if acroform is not None and '/Fields' in acroform:
+                for field in acroform['/Fields']:
+                    if field['/T'] is not None:
+                        field_index[field['/T'][1:-1]] = field  # Extract field name without parentheses
+
+            _template, _field_index = reader, field_index
+
+    return _template
+
+@traced('pdf_render')
+def render_application(bucket_name, fields_to_update):
+    """
+    Fills the template's form fields and returns the completed PDF as bytes, without touching the filesystem.
+    """
+    template = load_template(bucket_name)
+
+    # The template is shared, so filling and serializing must not interleave between threads
+    with _lock:
+        # Every field is rewritten, so nothing from the previous application survives in the shared template.
+        # pdfrw drops keys set to None, so missing values are written as an explicit empty string.
+        for field_name, field in _field_index.items():
+            field_value = fields_to_update.get(field_name)
+            field.update(pdfrw.PdfDict(V=pdfrw.PdfString.encode(str(field_value)) if field_value is not None else pdfrw.PdfString('()')))
+
+        writer = pdfrw.PdfWriter()
+        writer.addpage(template.pages[0])  # Assuming you are updating the first page
+
+        output_stream = io.BytesIO()
+        writer.write(output_stream)
+
+    annotate(Bytes=output_stream.tell())
+    return output_stream.getvalue()
+
+def application_object_key(username, session_id, application_id):
+    """
+    Returns a per-user, per-session, per-application S3 key so concurrent applications never share an object.
+    """
+    safe_username = re.sub(r"[^A-Za-z0-9_-]", "-", username)
+    safe_session_id = re.sub(r"[^A-Za-z0-9_-]", "-", session_id)
+    return f"agent/applications/{safe_username}/{safe_session_id}/{application_id}/{completed_file_name}"
+
+@traced('pdf_upload')
+def upload_application(bucket_name, object_key, fields_to_update):
+    """
+    Renders the completed application and streams it to S3 from memory.
+    """
+    completed_application = render_application(bucket_name, fields_to_update)
+    get_s3_client().upload_fileobj(
+        io.BytesIO(completed_application),
+        bucket_name,
+        object_key,
+        ExtraArgs={'ContentType': 'application/pdf'},
+        Config=transfer_config
+    )
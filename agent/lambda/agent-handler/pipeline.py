@@ -0,0 +1,48 @@
+import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from tracing import propagate, span
+
+# Shared pool for independent downstream calls within a single request. Tasks submitted here must not
+# block on other tasks in the same pool.
+executor = ThreadPoolExecutor(max_workers=8)
+
+class RequestPipeline:
+    """
+    Runs the stages of one request, overlapping independent ones, and records when each stage started and
+    how long it took, so the critical path of the request is visible in the logs.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.stages = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            with span(name):
+                yield
+        finally:
+            end = time.perf_counter()
+            with self.lock:
+                self.stages.append((name, start - self.started_at, end - start))
+
+    def run(self, name, function, *args, **kwargs):
+        with self.stage(name):
+            return function(*args, **kwargs)
+
+    def submit(self, name, function, *args, **kwargs):
+        """
+        Starts a stage on the shared pool and returns its future.
+        """
+        return executor.submit(propagate(self.run), name, function, *args, **kwargs)
+
+    def report(self):
+        total = time.perf_counter() - self.started_at
+        serial = sum(duration for _, _, duration in self.stages)
+        stages = ", ".join(f"{name} @{offset * 1000:.0f}ms +{duration * 1000:.0f}ms" for name, offset, duration in sorted(self.stages, key=lambda stage: stage[1]))
+        print(f"Pipeline {self.name}: {total * 1000:.0f} ms total ({serial * 1000:.0f} ms if serial); {stages}")
@@ -0,0 +1,56 @@
+import os
+import hmac
+import json
+import hashlib
+
+# Validated slot facts carried between Lex turns in sessionAttributes. Each fact is signed so a client
+# that edits its own session attributes cannot skip validation. SESSION_SIGNING_KEY must be shared by all containers
+# (the stack sets it from the SessionSigningKey secret); without it a per-container key is used, and facts recorded by
+# another container fail verification and are re-validated.
+FACTS_ATTRIBUTE = 'validatedFacts'
+signing_key = (os.environ.get('SESSION_SIGNING_KEY') or os.urandom(32).hex()).encode('utf-8')
+
+def _signature(session_id, name, value, parsed):
+    message = json.dumps([session_id, name, value, parsed], default=str).encode('utf-8')
+    return hmac.new(signing_key, message, hashlib.sha256).hexdigest()[:32]
+
+def _load(session_attributes):
+    try:
+        return json.loads(session_attributes.get(FACTS_ATTRIBUTE) or '{}')
+    except ValueError:
+        return {}
+
+class SessionFacts:
+    """
+    The validated facts of one turn, parsed from sessionAttributes once and written back once by save().
+    """
+
+    def __init__(self, session_attributes, session_id):
+        self.session_attributes = session_attributes
+        self.session_id = session_id
+        self.facts = _load(session_attributes)
+        self.changed = False
+
+    def get(self, name, value):
+        """
+        Returns the parsed value recorded for slot 'name' if it was validated for exactly 'value' in this session, else None.
+        """
+        fact = self.facts.get(name)
+        if fact is None or fact.get('value') != value:
+            return None
+        if not hmac.compare_digest(fact.get('mac', ''), _signature(self.session_id, name, value, fact.get('parsed'))):
+            print(f"Discarding session fact with invalid signature: {name}")
+            return None
+        return fact.get('parsed')
+
+    def record(self, name, value, parsed=True):
+        """
+        Records that slot 'name' was validated for 'value', along with its parsed form.
+        """
+        self.facts[name] = {'value': value, 'parsed': parsed, 'mac': _signature(self.session_id, name, value, parsed)}
+        self.changed = True
+
+    def save(self):
+        if self.changed:
+            self.session_attributes[FACTS_ATTRIBUTE] = json.dumps(self.facts, separators=(',', ':'), default=str)
+            self.changed = False
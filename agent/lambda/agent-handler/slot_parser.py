@@ -0,0 +1,217 @@
+import re
+import threading
+from collections import Counter
+
+# Deterministic parsing of loan slot values ('$450,000', '450k', '5,000.50', 'about 720', 'four hundred fifty thousand',
+# 'yeah I do'), so formatted answers are normalized locally instead of falling back to the agent (Kendra + Bedrock).
+
+HEDGE_WORDS = {'about', 'around', 'approximately', 'approx', 'roughly', 'nearly', 'almost', 'maybe', 'probably', 'like',
+               'just', 'over', 'under', 'close', 'to', 'somewhere', 'i', 'have', 'has', 'make', 'earn', 'pay', 'owe',
+               'want', 'need', 'would', 'borrow', 'it', 'is', 'its', "it's", 'my', 'score', 'of', 'a', 'an', 'the',
+               'usd', 'dollars', 'dollar', 'bucks', 'per', 'month', 'monthly', 'each', 'every', 'mo', 'think', 'guess'}
+UNITS = {
+    'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7, 'eight': 8, 'nine': 9,
+    'ten': 10, 'eleven': 11, 'twelve': 12, 'thirteen': 13, 'fourteen': 14, 'fifteen': 15, 'sixteen': 16,
+    'seventeen': 17, 'eighteen': 18, 'nineteen': 19, 'twenty': 20, 'thirty': 30, 'forty': 40, 'fifty': 50,
+    'sixty': 60, 'seventy': 70, 'eighty': 80, 'ninety': 90
+}
+SCALES = {'hundred': 100, 'thousand': 1000, 'grand': 1000, 'k': 1000, 'million': 1000000, 'mil': 1000000, 'm': 1000000}
+
+NUMBER_PATTERN = re.compile(r"^\$?(\d{1,3}(?:,\d{3})+|\d+)(\.\d+)?\$?$")
+# Commas only as thousands separators, so '450,00' or '1,2,3' split into several numbers and are rejected
+TOKEN_PATTERN = re.compile(r"\$?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?[km]?|[a-z']+")
+
+YES, NO, UNKNOWN = 'Yes', 'No', 'Unknown'
+YES_WORDS = {'yes', 'yeah', 'yea', 'yep', 'yup', 'ya', 'yah', 'sure', 'correct', 'right', 'affirmative', 'absolutely',
+             'definitely', 'ok', 'okay', 'y'}
+NO_WORDS = {'no', 'nope', 'nah', 'negative', 'none', 'never', 'n'}
+YES_PHRASES = {'of course', 'i do', 'i have', 'i will', 'i am', 'i did', 'that is right', 'that is correct'}
+NO_PHRASES = {'not really', 'i do not', "i don't", 'i dont', 'i have not', "i haven't", 'i will not', "i won't",
+              'i am not', "i'm not", 'i did not', "i didn't"}
+# Real words reachable by one of the typo edits below, which must not be read as a misspelled yes or no
+NOT_TYPOS = {'on', 'one', 'ever', 'sue', 'ope', 'ay'}
+
+def typo_variants(word):
+    """
+    Spellings within a bounded edit distance of 'word': adjacent transpositions and doubled letters, plus single
+    deletions for words of four or more letters. Substitutions are left out, as they turn 'yes' into 'yet' and
+    'nope' into 'note' or 'hope'.
+    """
+    variants = {word[:i] + word[i + 1] + word[i] + word[i + 2:] for i in range(len(word) - 1)}
+    variants |= {word[:i] + word[i] + word[i:] for i in range(len(word))}
+    if len(word) >= 4:
+        variants |= {word[:i] + word[i + 1:] for i in range(len(word))}
+    return variants
+
+def build_polarity_lookup():
+    """
+    Precomputes the word -> polarity table used by yes_no_polarity, including typo variants of the accepted words.
+    """
+    # Each word's variants are computed once; a variant reachable from both polarities is ambiguous
+    yes_variants = set().union(*(typo_variants(word) for word in YES_WORDS)) - NOT_TYPOS
+    no_variants = set().union(*(typo_variants(word) for word in NO_WORDS)) - NOT_TYPOS
+    ambiguous = yes_variants & no_variants
+
+    lookup = dict.fromkeys(yes_variants - ambiguous, YES)
+    lookup.update(dict.fromkeys(no_variants - ambiguous, NO))
+    lookup.update(dict.fromkeys(YES_WORDS, YES))
+    lookup.update(dict.fromkeys(NO_WORDS, NO))
+    lookup.update(dict.fromkeys(YES_PHRASES, YES))
+    lookup.update(dict.fromkeys(NO_PHRASES, NO))
+    return lookup
+
+class SlotParseStats:
+    """
+    Per-slot counts of how each value was handled: 'plain' (already normalized), 'normalized' (parsed locally)
+    or 'llm_fallback' (unparseable, sent to the agent).
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, slot_name, outcome):
+        with self.lock:
+            self.counts[(slot_name, outcome)] += 1
+
+    def summary(self):
+        with self.lock:
+            counts = dict(self.counts)
+        fallbacks = sum(count for (_, outcome), count in counts.items() if outcome == 'llm_fallback')
+        total = sum(counts.values())
+        return {
+            'llm_fallbacks': fallbacks,
+            'total': total,
+            'llm_fallback_rate': fallbacks / total if total else 0.0,
+            'by_slot': {f"{slot_name}.{outcome}": count for (slot_name, outcome), count in sorted(counts.items())}
+        }
+
+stats = SlotParseStats()
+
+def words_to_number(words):
+    """
+    Converts spelled-out number words ('four hundred fifty thousand') to a number, or returns None.
+    Digit-by-digit or out-of-order words ('four fifty thousand', 'one two three') and scale words without a number
+    ('grand', 'k') are rejected rather than guessed.
+    """
+    # 'previous' is the value of the previous unit or tens word, None after a scale word
+    total, current, previous, last_scale, seen = 0, 0, None, None, False
+    for word in words:
+        if word == 'and':
+            continue
+        if word in UNITS:
+            value = UNITS[word]
+            # Only a tens word may be followed by another number word, and only by a single digit ('twenty five')
+            if previous is not None and not (previous >= 20 and previous % 10 == 0 and 0 < value < 10):
+                return None
+            current += value
+            previous = value
+        elif word in SCALES:
+            scale = SCALES[word]
+            if not seen or (scale == 100 and not 0 < current < 100):
+                return None
+            if scale == 100:
+                current *= scale
+            else:
+                # Larger magnitudes come first: 'two million five thousand', never 'five thousand two million'
+                if current == 0 or (last_scale is not None and scale >= last_scale):
+                    return None
+                total += current * scale
+                current, last_scale = 0, scale
+            previous = None
+        else:
+            return None
+        seen = True
+    return total + current if seen else None
+
+def parse_number(text):
+    """
+    Parses a currency or count answer into a number, or returns None if it is not (only) a number.
+    Accepts thousands separators, '$', decimal cents, magnitude suffixes ('450k', '1.2 million'), spelled-out
+    numbers and hedges like 'about'. Answers containing more than one number are rejected as ambiguous.
+    A leading minus sign is kept, so the slot validators can reject negative amounts.
+    """
+    if text is None:
+        return None
+    text = str(text).strip().lower()
+    if text.startswith('-'):
+        number = parse_number(text[1:])
+        return -number if number is not None else None
+    match = NUMBER_PATTERN.match(text)
+    if match:
+        return to_number(match.group(1).replace(',', '') + (match.group(2) or ''))
+
+    tokens = [token for token in TOKEN_PATTERN.findall(text.replace('-', ' ')) if token not in HEDGE_WORDS]
+    if not tokens:
+        return None
+
+    numeric = [token for token in tokens if token[0].isdigit() or token[0] == '$']
+    if len(numeric) > 1:
+        return None
+    if numeric:
+        token = numeric[0].strip('$').replace(',', '')
+        multiplier = 1
+        if token[-1] in 'km':
+            multiplier = SCALES[token[-1]]
+            token = token[:-1]
+        rest = list(tokens)
+        rest.remove(numeric[0])
+        # Only a magnitude word may follow the digits, e.g. '1.2 million' or '450 thousand'
+        if len(rest) > 1 or (rest and rest[0] not in SCALES):
+            return None
+        if rest:
+            multiplier *= SCALES[rest[0]]
+        try:
+            return to_number(float(token) * multiplier)
+        except ValueError:
+            return None
+
+    number = words_to_number(tokens)
+    return to_number(number) if number is not None else None
+
+def to_number(value):
+    number = float(value)
+    return int(number) if number.is_integer() else round(number, 2)
+
+def format_number(number):
+    """
+    Formats a parsed number the way Lex resolves a plain numeric answer, e.g. 450000 or 5000.5.
+    """
+    return str(number)
+
+WORD_PATTERN = re.compile(r"[a-z']+")
+POLARITY_LOOKUP = build_polarity_lookup()
+
+def yes_no_polarity(text):
+    """
+    Classifies a yes/no answer ('yeah', 'yse', 'nope, I don't') as YES or NO, or UNKNOWN for anything else,
+    including real words close to yes/no such as 'yet' or 'note'.
+    """
+    if text is None:
+        return UNKNOWN
+    words = WORD_PATTERN.findall(str(text).lower())
+    if not words:
+        return UNKNOWN
+
+    polarity = POLARITY_LOOKUP.get(' '.join(words))
+    if polarity is not None:
+        return polarity
+
+    # A leading 'yeah' or 'nope' followed by a phrase of the same polarity, e.g. 'yeah I do' or 'no I don't'
+    polarity = POLARITY_LOOKUP.get(words[0])
+    if polarity is not None and POLARITY_LOOKUP.get(' '.join(words[1:])) == polarity:
+        return polarity
+    return UNKNOWN
+
+def parse_slot_value(slot_type, value):
+    """
+    Parses a slot answer by slot type ('number', 'yes_no' or 'text').
+    Returns the normalized slot value and its parsed form, or None if the answer cannot be parsed locally.
+    """
+    if slot_type == 'number':
+        number = parse_number(value)
+        return (format_number(number), number) if number is not None else None
+    if slot_type == 'yes_no':
+        polarity = yes_no_polarity(value)
+        return (polarity, polarity) if polarity != UNKNOWN else None
+    return value, value
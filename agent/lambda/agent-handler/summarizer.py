@@ -0,0 +1,42 @@
+import os
+import re
+
+# 'inline' asks the answering model for the summary in the same generation, 'extractive' summarizes locally
+# and 'chain' makes a second call on the 'summary' model route (see model_router.py)
+summary_strategy = os.environ.get('SUMMARY_STRATEGY', 'inline').lower()
+summary_word_limit = 50
+
+SUMMARY_INSTRUCTION = "After your response and sources, write a summary of your response within {} words between <summary></summary> tags.".format(summary_word_limit)
+SUMMARY_PATTERN = re.compile(r"<summary>(.*?)(?:</summary>|$)", re.DOTALL)
+SOURCE_PATTERN = re.compile(r"\[Source[^\]]*\]")
+
+def split_inline_summary(text):
+    """
+    Separates the <summary> block requested by SUMMARY_INSTRUCTION from the user-facing answer.
+    Returns (answer, summary) where summary is None if the model did not produce a complete one.
+    """
+    match = SUMMARY_PATTERN.search(text)
+    if match is None:
+        return text, None
+
+    answer = (text[:match.start()] + text[match.end():]).strip()
+    summary = match.group(1).strip() if '</summary>' in match.group(0) else None
+    return answer, summary or None
+
+def extractive_summary(text, max_words=summary_word_limit):
+    """
+    Builds a summary from the leading sentences of the answer, without an LLM call.
+    """
+    text = " ".join(SOURCE_PATTERN.sub("", text).split())
+    sentences = re.split(r"(?<=[.!?])\s+", text)
+
+    summary_words = []
+    for sentence in sentences:
+        words = sentence.split()
+        if summary_words and len(summary_words) + len(words) > max_words:
+            break
+        summary_words.extend(words)
+
+    if len(summary_words) > max_words:
+        return " ".join(summary_words[:max_words]) + "..."
+    return " ".join(summary_words)
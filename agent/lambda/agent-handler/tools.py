@@ -1,15 +1,41 @@
 import os
-import json
-import boto3
 from langchain.agents.tools import Tool
 from urllib.parse import urlparse
-
-bedrock = boto3.client('bedrock-runtime', region_name=os.environ['AWS_REGION'])
+from cache import create_answer_cache
+from clients import get_kendra
+from bedrock import truncate_to_sentence
+from deadline import run_with_deadline
+from model_router import FAQ_ANSWER, generate
+from tracing import annotate, traced
+from summarizer import summary_strategy, split_inline_summary, SUMMARY_INSTRUCTION
+
+# Answer cache shared across warm invocations; a hit skips both the Kendra query and the Bedrock call
+answer_cache = create_answer_cache()
+
+# Streaming mode returns a sentence-complete answer as soon as the token or character budget is reached
+bedrock_streaming = os.environ.get('BEDROCK_STREAMING', 'false').lower() == 'true'
+max_answer_chars = int(os.environ.get('BEDROCK_STREAM_MAX_CHARS', '0'))
+
+# 'kendra' queries KENDRA_INDEX_ID, 'local' searches the offline FAQ index shipped in the package (see local_index.py)
+retrieval_backend = os.environ.get('RETRIEVAL_BACKEND', 'kendra').lower()
+
+# 'retrieve' uses the Kendra Retrieve API (semantic passages), 'query' the Query API (excerpts and FAQ answers)
+kendra_retrieval_mode = os.environ.get('KENDRA_RETRIEVAL_MODE', 'query').lower()
+kendra_page_size = int(os.environ.get('KENDRA_PAGE_SIZE', '5'))
+# Longest wait for a Kendra call within the request deadline, so retrieval leaves time for generation
+kendra_timeout = float(os.environ.get('KENDRA_TIMEOUT_MS', '5000')) / 1000
+
+# Retrieved passages are passed to the LLM as a compact, ranked context block within this budget
+context_max_tokens = int(os.environ.get('CONTEXT_MAX_TOKENS', '1500'))
+passage_max_chars = int(os.environ.get('CONTEXT_PASSAGE_MAX_CHARS', '1200'))
 
 class Tools:
 
     def __init__(self) -> None:
         print("Initializing Tools")
+        self.last_summary = None
+        # Set when the last answer was cut short by max_tokens or the deadline, so it is not cached
+        self.last_answer_cut_short = False
         self.tools = [
             Tool(
                 name="AnyCompany",
@@ -39,30 +65,119 @@ class Tools:
 
         return modified_response
 
-    def kendra_search(self, question):
+    def get_passage(self, item):
         """
-        Performs a Kendra search using the Query API.
+        Returns the answer text of a Kendra result item, for both Query and Retrieve result shapes.
         """
-        kendra = boto3.client('kendra')
+        if 'Content' in item:
+            return item['Content']
+
+        if item.get('Type') == 'QUESTION_ANSWER':
+            for attribute in item.get('AdditionalAttributes', []):
+                if attribute.get('Key') == 'AnswerText':
+                    return attribute['Value']['TextWithHighlightsValue']['Text']
+
+        return item.get('DocumentExcerpt', {}).get('Text', '')
 
-        kendra_response = kendra.query(
-            IndexId=os.getenv('KENDRA_INDEX_ID'),
-            QueryText=question,
-            PageNumber=1,
-            PageSize=5  # Limit to 5 results
-        )
+    def build_context(self, parsed_results, max_tokens=None):
+        """
+        Builds a compact context block from ranked Kendra results: one numbered entry per distinct '_source_uri',
+        each passage trimmed to 'passage_max_chars', stopping once the approximate token budget is spent.
+        """
+        budget_chars = (max_tokens or context_max_tokens) * 4  # Approximate tokens as 4 characters
+        sources = {}
+
+        for item in parsed_results.get('ResultItems', []):
+            source_uri = item.get('_source_uri') or item.get('DocumentURI', '')
+            title = item.get('DocumentTitle', '')
+            if isinstance(title, dict):
+                title = title.get('Text', '')
+
+            passage = " ".join(self.get_passage(item).replace('...', ' ').split())
+            if len(passage) > passage_max_chars:
+                passage = truncate_to_sentence(passage[:passage_max_chars])
+            if not passage:
+                continue
+
+            # Results from the same source are merged under one citation number
+            if source_uri not in sources:
+                sources[source_uri] = {'title': title, 'passages': []}
+            if passage not in sources[source_uri]['passages']:
+                sources[source_uri]['passages'].append(passage)
+
+        entries = []
+        used_chars = 0
+        for number, (source_uri, source) in enumerate(sources.items(), start=1):
+            entry = f"[Source {number}: {source['title']} - {source_uri}]\n" + "\n".join(source['passages'])
+            if entries and used_chars + len(entry) > budget_chars:
+                break
+            # Only the top-ranked entry can be over budget on its own; it is cut at a sentence or word boundary
+            entries.append(truncate_to_sentence(entry[:budget_chars]) if len(entry) > budget_chars else entry)
+            used_chars += len(entry)
+
+        return "\n\n".join(entries)
+
+    @traced('kendra_search')
+    def kendra_search(self, question, deadline=None, task=FAQ_ANSWER):
+        """
+        Performs a Kendra search using the Query or Retrieve API (see KENDRA_RETRIEVAL_MODE), or a local index search,
+        and answers with the model routed for 'task'.
+        With a 'deadline', the search and the answer raise DeadlineExceeded when they cannot finish in time.
+        """
+        self.last_summary = None
+        self.last_answer_cut_short = False
+
+        if answer_cache is not None:
+            cached_answer = answer_cache.get(question)
+            print(f"Answer cache stats: {answer_cache.stats()}")
+            if cached_answer is not None:
+                return cached_answer
+
+        if retrieval_backend == 'local':
+            from local_index import get_local_index
+
+            kendra_response = get_local_index().search(question, kendra_page_size)
+        elif kendra_retrieval_mode == 'retrieve':
+            kendra_response = run_with_deadline(
+                deadline, 'kendra', get_kendra().retrieve,
+                cap=kendra_timeout,
+                IndexId=os.getenv('KENDRA_INDEX_ID'),
+                QueryText=question,
+                PageSize=kendra_page_size
+            )
+        else:
+            kendra_response = run_with_deadline(
+                deadline, 'kendra', get_kendra().query,
+                cap=kendra_timeout,
+                IndexId=os.getenv('KENDRA_INDEX_ID'),
+                QueryText=question,
+                PageNumber=1,
+                PageSize=kendra_page_size
+            )
 
         parsed_results = self.parse_kendra_response(kendra_response)
 
-        print(f"Amazon Kendra Query Item: {parsed_results}")
+        annotate(Results=len(parsed_results.get('ResultItems', [])))
 
-        # passing in the original question, and various Kendra responses as context into the LLM
-        return self.invokeLLM(question, parsed_results)
+        # passing in the original question, and the ranked Kendra passages as context into the LLM
+        context = self.build_context(parsed_results)
+        answer = self.invokeLLM(question, context, deadline, task)
 
-    def invokeLLM(self, question, context):
+        # An answer cut short under the deadline is not worth reusing
+        if answer_cache is not None and not self.last_answer_cut_short:
+            answer_cache.put(question, answer)
+
+        return answer
+
+    @traced('invoke_llm')
+    def invokeLLM(self, question, context, deadline=None, task=FAQ_ANSWER):
         """
-        Generates an answer for the user based on the Kendra response.
+        Generates an answer for the user based on the Kendra response, with the model and max_tokens of the 'task' route
+        fitted to the 'deadline'.
+        With the 'inline' summary strategy, the summary stored in memory is generated in the same call and kept in 'last_summary'.
         """
+        summary_instruction = SUMMARY_INSTRUCTION if summary_strategy == 'inline' else ""
+
         prompt_data = f"""
         Human:
         Imagine you are AnyCompany's Mortgage AI assistant. You respond quickly and friendly to questions from a user, providing both an answer and the sources used to find that answer.
@@ -71,6 +186,8 @@ class Tools:
 
         At the end of your response, include the relevant sources if information from specific sources was used in your response. Use the following format for each of the sources used: [Source #: Source Title - Source Link].
 
+        {summary_instruction}
+
         Using the following context, answer the following question to the best of your ability. Do not include information that is not relevant to the question, and only provide information based on the context provided without making assumptions. 
 
         Question: {question}
@@ -80,36 +197,20 @@ class Tools:
         \n\nAssistant:
         """
 
-        # Formatting the prompt as a JSON string
-        json_prompt = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 4096,
-            "temperature": 0.5,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt_data
-                        }
-                    ]
-                }
-            ]
-        })
-
-        # Invoking Claude3, passing in our prompt
-        response = bedrock.invoke_model(
-            body=json_prompt,
-            modelId="anthropic.claude-3-sonnet-20240229-v1:0",
-            accept="application/json",
-            contentType="application/json"
-        )
-
-        # Getting the response from Claude3 and parsing it to return to the end user
-        response_body = json.loads(response['body'].read())
-        answer = response_body['content'][0]['text']
+        # FAQ answers use the primary model (hedged to a faster one when slow or throttled, see bedrock.py); slot
+        # clarifications are routed to a fast model with a small token budget (see model_router.py)
+        usage = {}
+        answer = generate(task, prompt_data, stream=bedrock_streaming, max_chars=max_answer_chars, deadline=deadline, usage=usage)
+        self.last_answer_cut_short = usage.get('cut_short', False)
+
+        return self.split_summary(answer)
 
+    def split_summary(self, answer):
+        """
+        Strips the inline summary from the answer and keeps it for the conversation memory.
+        """
+        if summary_strategy == 'inline':
+            answer, self.last_summary = split_inline_summary(answer)
         return answer
 
 # Pass the initialized retriever and llm to the Tools class constructor
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import uuid
+import functools
+import contextvars
+import threading
+
+# Lightweight request tracing. With TRACING_ENABLED=true every span is printed at the end of the request as one JSON
+# line that is both a structured span and a CloudWatch Embedded Metric Format (EMF) record, so CloudWatch extracts
+# Duration, Bytes, Tokens and Cost metrics per Intent and Span without any agent or API call. When disabled, decorators
+# return the undecorated function and span() returns a shared no-op, so instrumented code costs one flag check.
+tracing_enabled = os.environ.get('TRACING_ENABLED', 'false').lower() == 'true'
+metrics_namespace = os.environ.get('TRACING_NAMESPACE', 'FSIAgent')
+
+METRICS = [
+    {'Name': 'Duration', 'Unit': 'Milliseconds'},
+    {'Name': 'Bytes', 'Unit': 'Bytes'},
+    {'Name': 'Tokens', 'Unit': 'Count'},
+    {'Name': 'Cost', 'Unit': 'None'}
+]
+
+_current_trace = contextvars.ContextVar('trace', default=None)
+_current_span = contextvars.ContextVar('span', default=None)
+
+class Trace:
+    """
+    The spans of one request, printed together by finish().
+    """
+
+    def __init__(self, intent):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.intent = intent
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def finish(self):
+        with self.lock:
+            spans, self.spans = self.spans, []
+        for span in spans:
+            print(json.dumps(span.record(self), separators=(',', ':'), default=str))
+
+class Span:
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:8]
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.token = None
+
+    def __enter__(self):
+        self.token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        _current_span.reset(self.token)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(self)
+        return False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def record(self, trace):
+        record = {
+            '_aws': {
+                'Timestamp': int(self.started_at * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': metrics_namespace,
+                    'Dimensions': [['Intent', 'Span']],
+                    'Metrics': [metric for metric in METRICS if metric['Name'] in self.attributes or metric['Name'] == 'Duration']
+                }]
+            },
+            'Intent': trace.intent,
+            'Span': self.name,
+            'Duration': round(self.duration * 1000, 2),
+            'TraceId': trace.trace_id,
+            'SpanId': self.span_id,
+            'ParentId': self.parent_id
+        }
+        record.update(self.attributes)
+        return record
+
+class _NoopSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+def span(name, **attributes):
+    """
+    Returns a context manager timing 'name' as a child of the current span.
+    """
+    if not tracing_enabled or _current_trace.get() is None:
+        return NOOP_SPAN
+    return Span(name, attributes)
+
+def annotate(**attributes):
+    """
+    Adds attributes (e.g. Bytes=..., Tokens=...) to the current span. Numeric Bytes, Tokens and Cost are summed.
+    """
+    if not tracing_enabled:
+        return
+    current = _current_span.get()
+    if current is None:
+        return
+    for key, value in attributes.items():
+        if key in ('Bytes', 'Tokens', 'Cost') and key in current.attributes:
+            value += current.attributes[key]
+        current.attributes[key] = value
+
+def traced(name):
+    """
+    Decorates a function so each call is a span. Without TRACING_ENABLED the function is returned unchanged.
+    """
+    def decorator(function):
+        if not tracing_enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def start_trace(intent):
+    """
+    Starts the trace of one request; returns a token for finish_trace, or None when tracing is disabled.
+    """
+    if not tracing_enabled:
+        return None
+    return _current_trace.set(Trace(intent))
+
+def finish_trace(token):
+    if token is None:
+        return
+    trace = _current_trace.get()
+    _current_trace.reset(token)
+    if trace is not None:
+        trace.finish()
+
+def propagate(function):
+    """
+    Wraps 'function' to run in the caller's trace context, for work handed to a thread pool.
+    """
+    if not tracing_enabled:
+        return function
+    context = contextvars.copy_context()
+    return functools.partial(context.run, function)
+
+# --- botocore ---
+
+def _before_call(model, context, **kwargs):
+    current = span(f"{model.service_model.service_name}.{model.name}", Service=model.service_model.service_name)
+    if current is not NOOP_SPAN:
+        current.__enter__()
+        context['tracing_span'] = current
+
+def _after_call(http_response, parsed, model, context, **kwargs):
+    current = context.pop('tracing_span', None)
+    if current is None:
+        return
+    headers = getattr(http_response, 'headers', {}) or {}
+    if headers.get('content-length'):
+        current.set(Bytes=int(headers['content-length']))
+    # Bedrock reports the token usage of InvokeModel in response headers (streams report it in their last event)
+    tokens = [headers.get(header) for header in ('x-amzn-bedrock-input-token-count', 'x-amzn-bedrock-output-token-count')]
+    if any(tokens):
+        current.set(Tokens=sum(int(count) for count in tokens if count))
+    current.set(StatusCode=getattr(http_response, 'status_code', None))
+    current.__exit__(None, None, None)
+
+def _after_call_error(context, exception, **kwargs):
+    current = context.pop('tracing_span', None)
+    if current is not None:
+        current.__exit__(type(exception), exception, None)
+
+def instrument_client(client):
+    """
+    Times every API call of a boto3 client (or the client of a boto3 resource) with botocore event hooks.
+    """
+    if tracing_enabled:
+        # Resources are traced through their underlying client
+        events = getattr(client.meta, 'client', client).meta.events
+        events.register('before-call.*.*', _before_call)
+        events.register('after-call.*.*', _after_call)
+        events.register('after-call-error.*.*', _after_call_error)
+    return client
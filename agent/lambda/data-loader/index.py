@@ -1,8 +1,14 @@
+import sys
 import json
 import os
+import time
+import random
 import boto3
 import logging
 import cfnresponse
+from decimal import Decimal
+from boto3.dynamodb.types import TypeSerializer
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -10,7 +16,92 @@ logger.setLevel(logging.INFO)
 user_accounts_table_name = os.environ.get('USER_EXISTING_ACCOUNTS_TABLE')
 REGION = os.environ.get('AWS_REGION')
 
+# BatchWriteItem accepts at most 25 put requests per call
+BATCH_SIZE = 25
+WRITER_THREADS = int(os.environ.get('WRITER_THREADS', '8'))
+MAX_RETRIES = int(os.environ.get('MAX_RETRIES', '8'))
+BACKOFF_BASE_SECONDS = 0.05
+BACKOFF_CAP_SECONDS = 5.0
+
 dynamodb = boto3.client('dynamodb', region_name=REGION)
+serializer = TypeSerializer()
+
+def read_records(path):
+    """
+    Streams records from a JSON array file, or line by line from a JSON-lines (.jsonl/.ndjson) file.
+    Numbers are parsed as Decimal, which is the only numeric type the DynamoDB serializer accepts.
+    """
+    with open(path, 'r') as file:
+        if path.endswith('.jsonl') or path.endswith('.ndjson'):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line, parse_float=Decimal)
+        else:
+            yield from json.load(file, parse_float=Decimal)
+
+def to_dynamodb_item(record):
+    """
+    Serializes a record into DynamoDB attribute values, including nested maps, lists and booleans.
+    Top-level nulls are stored as empty strings, as the agent handler expects.
+    """
+    return {key: serializer.serialize('' if value is None else value) for key, value in record.items()}
+
+def chunked(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def write_batch(table_name, records):
+    """
+    Writes up to 25 records, retrying UnprocessedItems with exponential backoff and full jitter.
+    Returns the number of retries that were needed.
+    """
+    request_items = {table_name: [{'PutRequest': {'Item': to_dynamodb_item(record)}} for record in records]}
+
+    for attempt in range(MAX_RETRIES + 1):
+        response = dynamodb.batch_write_item(RequestItems=request_items)
+        request_items = response.get('UnprocessedItems') or {}
+        if not request_items:
+            return attempt
+        time.sleep(random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)))
+
+    raise RuntimeError("{} items still unprocessed after {} retries".format(len(request_items[table_name]), MAX_RETRIES))
+
+def load_records(table_name, records, writer_threads=WRITER_THREADS):
+    """
+    Bulk-loads records into the table using parallel writer threads.
+    At most two batches per thread are in flight, so large files are never held in memory at once.
+    """
+    stats = {'items': 0, 'batches': 0, 'retries': 0}
+    start_time = time.time()
+
+    def record_result(future, batch_length):
+        stats['retries'] += future.result()
+        stats['batches'] += 1
+        stats['items'] += batch_length
+
+    with ThreadPoolExecutor(max_workers=writer_threads) as executor:
+        in_flight = {}
+        for batch in chunked(records, BATCH_SIZE):
+            if len(in_flight) >= writer_threads * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record_result(future, in_flight.pop(future))
+            in_flight[executor.submit(write_batch, table_name, batch)] = len(batch)
+
+        for future in list(in_flight):
+            record_result(future, in_flight.pop(future))
+
+    elapsed = time.time() - start_time
+    stats['seconds'] = round(elapsed, 3)
+    stats['items_per_second'] = round(stats['items'] / elapsed, 1) if elapsed > 0 else stats['items']
+    logger.info("Bulk load stats: %s", json.dumps(stats))
+    return stats
 
 def handler(event, context):
     logger.info("Received event: %s", json.dumps(event))
@@ -18,37 +109,9 @@ def handler(event, context):
     request_type = event.get('RequestType')
     if request_type == 'Create' or request_type == 'Update':
         try:
-            with open('MOCK_DATA.json', 'r') as file:
-                claims_data = json.load(file)
-            
-            items = []
-            for claim in claims_data:
-                item = {}
-                for key, value in claim.items():
-                    if value is None:
-                        result = {'S': ''}
-                    elif isinstance(value, str):
-                        result = {'S': value}
-                    elif isinstance(value, (int, float)):
-                        result = {'N': str(value)}
-                    elif isinstance(value, dict):
-                        nested_attributes = {}
-                        for nested_key, nested_value in value.items():
-                            nested_attributes[nested_key] = to_dynamodb_attribute(nested_value)
-                        result = {'M': nested_attributes}
-
-                    item[key] = result
-
-                items.append({'PutRequest': {'Item': item}})
-            
-            response = dynamodb.batch_write_item(
-                RequestItems={
-                    user_accounts_table_name: items
-                }
-            )
-            
-            logger.info("Batch write response: %s", json.dumps(response))
-            cfnresponse.send(event, context, cfnresponse.SUCCESS, responseData={})
+            data_file = event.get('ResourceProperties', {}).get('DataFile') or os.environ.get('DATA_FILE', 'MOCK_DATA.json')
+            stats = load_records(user_accounts_table_name, read_records(data_file))
+            cfnresponse.send(event, context, cfnresponse.SUCCESS, responseData={'ItemsLoaded': stats['items']})
         except Exception as e:
             logger.error("Failed to load data into DynamoDB table: %s", str(e))
             cfnresponse.send(event, context, cfnresponse.FAILED, responseData={"Error": str(e)})
@@ -60,3 +123,8 @@ def handler(event, context):
         'statusCode': 200,
         'body': json.dumps('Function execution completed successfully')
     }
+
+if __name__ == '__main__':
+    # Seed large load-test data sets from a workstation: python index.py <table-name> <accounts.jsonl>
+    logging.basicConfig()
+    load_records(sys.argv[1], read_records(sys.argv[2]))
@@ -12,6 +12,10 @@ export LEX_BOT_S3_KEY="agent/bot/lex.zip"
 echo "STACK_NAME: $STACK_NAME"
 echo "S3_ARTIFACT_BUCKET_NAME: $S3_ARTIFACT_BUCKET_NAME"
 
+# Package the Lambda sources, so the stack deploys the current handler and data loader code
+(cd ../agent/lambda/agent-handler && rm -f agent_deployment_package.zip && zip -q -r agent_deployment_package.zip *.py faq_index -x "*__pycache__*")
+(cd ../agent/lambda/data-loader && rm -f loader_deployment_package.zip && zip -q loader_deployment_package.zip index.py MOCK_DATA.json)
+
 aws s3 mb s3://$S3_ARTIFACT_BUCKET_NAME --region $AWS_REGION
 aws s3 cp ../agent/ s3://$S3_ARTIFACT_BUCKET_NAME/agent/ --region $AWS_REGION --recursive --exclude ".DS_Store" --exclude "*/.DS_Store"
 